@@ -0,0 +1,61 @@
+"""Shared, pooled HTTP session for search, HTML and PDF fetching."""
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import Config
+
+CFG = Config()
+
+DEFAULT_TIMEOUT = 10
+
+
+def _accept_encoding():
+    """Advertise brotli only when urllib3 is able to decode it."""
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        try:
+            import brotlicffi  # noqa: F401
+        except ImportError:
+            return "gzip, deflate"
+    return "gzip, deflate, br"
+
+
+def _build_session():
+    session = requests.Session()
+    # pool_block caps the open connections per host at pool_maxsize;
+    # extra callers wait for a connection instead of opening a new one.
+    adapter = HTTPAdapter(
+        pool_connections=CFG.http_pool_hosts,
+        pool_maxsize=CFG.http_per_host_connections,
+        pool_block=True,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
+        "User-Agent": CFG.user_agent,
+        "Accept-Encoding": _accept_encoding(),
+        "Connection": "keep-alive",
+    })
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Return the process-wide HTTP session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def http_get(url, timeout=DEFAULT_TIMEOUT, **kwargs):
+    """GET `url` through the shared session. Accepts the usual requests kwargs."""
+    return get_session().get(url, timeout=timeout, **kwargs)
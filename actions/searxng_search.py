@@ -1,16 +1,137 @@
-import requests
-SEARXNG_URL = "https://searx.alviolabs.com/search" 
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from actions.http_client import http_get
+from config import Config
+
+CFG = Config()
+SEARXNG_URL = "https://searx.alviolabs.com/search"
+
+_QUOTES = "\"'`\u201c\u201d\u2018\u2019\u00ab\u00bb"
+# Quotes at the start or end of a word; apostrophes inside words stay
+_EDGE_QUOTES = re.compile(f"(?<!\\w)[{_QUOTES}]+|[{_QUOTES}]+(?!\\w)")
+# Commas and semicolons between words, not inside numbers like 1,000
+_LOOSE_SEPARATORS = re.compile(r"[,;]+(?=\s|$)")
+_TRAILING = re.compile(r"[\s?!.]+$")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query):
+    """Normalize a query so near-identical strings share a cache entry.
+    Casefolds, drops surrounding quotes, separators between words and
+    trailing ?!., and collapses whitespace. Symbols inside words such as
+    + # - < > . @ / are kept, so "C++" and "C" stay different queries.
+    """
+    query = _EDGE_QUOTES.sub(" ", (query or "").casefold())
+    query = _LOOSE_SEPARATORS.sub(" ", query)
+    query = _WHITESPACE.sub(" ", query).strip()
+    return _TRAILING.sub("", query)
+
+
+def query_key(query):
+    """Key for requests that must ask exactly the same question: casefolds
+    and collapses whitespace only, so "2+2" and "2-2" stay distinct.
+    """
+    return _WHITESPACE.sub(" ", (query or "").casefold()).strip()
+
+
+class SearchResultCache:
+    """
+    SearXNG result cache keyed by normalized query. Entries are kept in
+    memory and in a local SQLite store for `ttl` seconds.
+    """
+
+    def __init__(self, path=None, ttl=None, max_memory_entries=1024):
+        self.path = path or os.path.join(CFG.cache_dir, "searxng.sqlite")
+        self.ttl = CFG.search_cache_ttl if ttl is None else ttl
+        self.max_memory_entries = max_memory_entries
+        self._memory = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, results TEXT, stored_at REAL)"
+        )
+        self._db.commit()
+
+    def get(self, key):
+        """Return the cached results for `key`, or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                row = self._db.execute(
+                    "SELECT stored_at, results FROM results WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = (row[0], json.loads(row[1]))
+                    self._remember(key, entry)
+            if entry is None:
+                return None
+            if now - entry[0] > self.ttl:
+                self._memory.pop(key, None)
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            return [dict(r) for r in entry[1]]
+
+    def put(self, key, results):
+        """Store a copy of `results`, so callers can annotate their own list."""
+        entry = (time.time(), [dict(r) for r in results])
+        with self._lock:
+            self._remember(key, entry)
+            self._db.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                (key, json.dumps(results), entry[0]),
+            )
+            # Expired rows are otherwise only dropped when looked up again
+            self._db.execute("DELETE FROM results WHERE stored_at < ?", (entry[0] - self.ttl,))
+            self._db.commit()
+
+    def _remember(self, key, entry):
+        self._memory.pop(key, None)
+        self._memory[key] = entry
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.pop(next(iter(self._memory)))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_search_cache():
+    """Return the process-wide search result cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SearchResultCache()
+    return _cache
+
+
 def searxng_search(query, max_search_result=3):
+    cache = get_search_cache() if CFG.search_cache_enabled else None
+    # "v2": entries keyed by the old punctuation-dropping normalization are ignored
+    cache_key = f"v2:{max_search_result}:{normalize_query(query)}"
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
     params = {
         "q": query,
         "format": "json",
         "num": max_search_result
     }
-    response = requests.get(SEARXNG_URL, params=params,timeout=10)
-    
+    response = http_get(SEARXNG_URL, params=params, timeout=10)
+
     if response.status_code == 200:
         results = response.json().get("results", [])
-        
+
         formatted_results = []
         for r in results:
             formatted_results.append({
@@ -19,6 +140,8 @@ def searxng_search(query, max_search_result=3):
                 "snippet": r.get("content", "No summary available.")
             })
 
+        if cache is not None:
+            cache.put(cache_key, formatted_results)
         return formatted_results
     else:
         return [{"error": "Search failed", "query": query}]
@@ -0,0 +1,162 @@
+"""Token-budgeted packing of research sources into a report prompt."""
+import math
+import re
+from collections import Counter
+
+from agent.tokenizer import count_tokens_batch
+
+_WORD = re.compile(r"\w+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in",
+    "is", "it", "of", "on", "or", "that", "the", "this", "to", "was", "what",
+    "when", "where", "which", "who", "why", "with",
+}
+
+# Clean text that only reports a failed fetch carries no research value.
+ERROR_PREFIXES = (
+    "Request timed out", "Network error", "Processing error", "Skipped non-text",
+    "[Not a PDF", "[PDF", "[Connection timeout", "[Network error",
+)
+
+
+def _terms(text):
+    return [w for w in _WORD.findall(text.lower()) if w not in STOPWORDS and len(w) > 1]
+
+
+class Chunk:
+    """A piece of one source's text, tagged with where it came from."""
+
+    def __init__(self, source_id, title, url, text, label=None):
+        self.source_id = source_id
+        self.title = title
+        self.url = url
+        self.text = text
+        self.label = label
+        self.tokens = 0
+        self.score = 0.0
+
+    def render(self):
+        if self.label:
+            return f"[{self.label} {self.source_id}]\n{self.text}\n"
+        return f"[Source {self.source_id}: {self.title} ({self.url})]\n{self.text}\n"
+
+
+class PackedContext:
+    """The packed prompt text plus a record of what was included and dropped."""
+
+    def __init__(self, text, included, dropped, budget):
+        self.text = text
+        self.included = included
+        self.dropped = dropped
+        self.budget = budget
+        self.used_tokens = sum(chunk.tokens for chunk in included)
+
+    def summary(self):
+        sources = {chunk.source_id for chunk in self.included}
+        dropped_sources = {chunk.source_id for chunk in self.dropped} - sources
+        return (
+            f"Packed {len(self.included)} chunks from {len(sources)} sources "
+            f"({self.used_tokens}/{self.budget} tokens); dropped {len(self.dropped)} chunks, "
+            f"{len(dropped_sources)} sources entirely"
+        )
+
+    def as_dict(self):
+        describe = lambda chunk: {
+            "source": chunk.source_id, "url": chunk.url,
+            "tokens": chunk.tokens, "score": round(chunk.score, 3),
+        }
+        return {
+            "budget": self.budget,
+            "used_tokens": self.used_tokens,
+            "included": [describe(chunk) for chunk in self.included],
+            "dropped": [describe(chunk) for chunk in self.dropped],
+        }
+
+
+def split_into_chunks(text, max_chars):
+    """Split text on line boundaries into pieces of at most `max_chars` characters."""
+    chunks, current, size = [], [], 0
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        while len(line) > max_chars:
+            if current:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            chunks.append(line[:max_chars])
+            line = line[max_chars:]
+        if size + len(line) > max_chars and current:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def score_chunks(question, chunks, k1=1.5, b=0.75):
+    """Score chunks against the question with BM25 (title terms count too)."""
+    query_terms = set(_terms(question))
+    docs = [Counter(_terms(f"{chunk.title} {chunk.text}")) for chunk in chunks]
+    if not docs or not query_terms:
+        return
+    avg_len = sum(sum(doc.values()) for doc in docs) / len(docs) or 1
+    doc_freq = Counter(term for doc in docs for term in query_terms if term in doc)
+    for chunk, doc in zip(chunks, docs):
+        length = sum(doc.values())
+        score = 0.0
+        for term in query_terms:
+            tf = doc.get(term, 0)
+            if not tf:
+                continue
+            idf = math.log(1 + (len(docs) - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_len))
+        chunk.score = score
+
+
+def pack_context(question, sources, budget_tokens, model=None, chunk_chars=2000, label=None):
+    """
+    Split sources into source-tagged chunks, score them against the question
+    and pack the best ones into `budget_tokens`.
+
+    Args:
+        question (str): The research question.
+        sources (list): Search results with title, url and clean_text.
+        budget_tokens (int): Tokens available for the research material.
+        model (str): Model whose tokenizer is used for counting.
+        chunk_chars (int): Maximum chunk size in characters.
+        label (str): Tag chunks as "[label N]" instead of "[Source N: title (url)]",
+            for material that is not itself a source, such as research notes.
+
+    Returns:
+        PackedContext: The packed text and what was included / dropped.
+    """
+    chunks = []
+    for source_id, source in enumerate(sources, start=1):
+        text = source.get("clean_text") or source.get("snippet") or ""
+        if not text or text.startswith(ERROR_PREFIXES):
+            continue
+        for piece in split_into_chunks(text, chunk_chars):
+            chunks.append(Chunk(source_id, source.get("title", "No Title"), source.get("url", "#"), piece, label))
+
+    for chunk, tokens in zip(chunks, count_tokens_batch([c.render() for c in chunks], model)):
+        chunk.tokens = tokens
+    score_chunks(question, chunks)
+
+    included, dropped, used = [], [], 0
+    # Highest score first; earlier sources and chunks win ties
+    for chunk in sorted(chunks, key=lambda c: -c.score):
+        if used + chunk.tokens <= budget_tokens:
+            included.append(chunk)
+            used += chunk.tokens
+        else:
+            dropped.append(chunk)
+
+    # Present the chosen chunks in source order so each source reads coherently
+    order = {id(chunk): i for i, chunk in enumerate(chunks)}
+    included.sort(key=lambda chunk: order[id(chunk)])
+    text = "\n".join(chunk.render() for chunk in included)
+    return PackedContext(text, included, dropped, budget_tokens)
+
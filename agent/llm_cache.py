@@ -0,0 +1,111 @@
+"""Persistent exact-match cache for LLM responses."""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from config import Config
+
+CFG = Config()
+
+
+def make_cache_key(provider, model, messages, **params):
+    """Key a completion by provider, model, messages and sampling parameters."""
+    payload = json.dumps(
+        {"provider": provider, "model": model, "messages": messages, "params": params},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    SQLite-backed response cache. Entries expire after `ttl` seconds and the
+    least recently used ones are evicted beyond `max_entries`.
+    """
+
+    def __init__(self, path=None, max_entries=None, ttl=None):
+        self.path = path or os.path.join(CFG.cache_dir, "llm_responses.sqlite")
+        self.max_entries = CFG.llm_cache_max_entries if max_entries is None else max_entries
+        self.ttl = CFG.llm_cache_ttl if ttl is None else ttl
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT,
+                stored_at REAL,
+                accessed_at REAL
+            )"""
+        )
+        self._db.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached response for `key`, or None."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response, stored_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, response, now, now)
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def _evict(self, now):
+        self._db.execute("DELETE FROM responses WHERE stored_at < ?", (now - self.ttl,))
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def stats(self):
+        """Return hit/miss counters and the number of stored responses."""
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """Return the process-wide response cache, or None when caching is disabled."""
+    global _cache
+    if not CFG.llm_cache_enabled:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMResponseCache()
+    return _cache
@@ -1,14 +1,27 @@
 import os
 import json
+import threading
+import time
 import boto3
 import requests
+from botocore.config import Config as BotoConfig
 from dotenv import load_dotenv
 
-from langchain.schema import AIMessage, HumanMessage
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
 from langchain_openai import ChatOpenAI
 from langchain_community.embeddings import OpenAIEmbeddings
 
+from actions.searxng_search import query_key
+from agent.llm_cache import get_llm_cache, make_cache_key
+from agent.provider_router import get_provider_router
+from agent.search_usage import SearchUsage, get_search_usage
+from agent.semantic_cache import get_semantic_cache
+from agent.tokenizer import count_tokens
+from config import Config
+from scrapper.fetcher import SingleFlight
+
 load_dotenv()
+CFG = Config()
 openai_api_key = os.getenv("OPENAI_API_KEY")
 aws_access_key_id = os.getenv("AWS_ACCESS_KEY_ID")
 aws_secret_access_key = os.getenv("AWS_SECRET_ACCESS_KEY")
@@ -418,88 +431,361 @@ I'm here to assist you with your tasks and look forward to working together to a
 """
 )
 
+# /search answers one question in one reply: no tools, sandbox, task
+# methodology, prompting guide or Manus persona
+compact_system_prompt = (
+"""
+# Marina AI - Search Assistant
+
+You are Marina AI. Answer the user's question directly, accurately and concisely.
+
+## How to Answer
+- Lead with the answer, then add the detail needed to understand or act on it
+- Use headers, lists, tables and code blocks where they make the answer easier to read
+- Scale the depth and technical level to the question
+- Include code examples when the question is about programming, with the language named
+- Say so when something is uncertain, disputed or likely out of date, rather than guessing
+- Do not invent sources, quotes, numbers or links
+- Keep the answer self-contained; do not describe your own capabilities or process
+"""
+)
+
+# Sections of the full prompt that describe the Manus agent, not a /search answer
+_AGENT_ONLY_MARKERS = (
+    "Manus", "Tools and Interfaces", "Task Approach Methodology", "Limitations",
+    "sandbox", "Shell", "Deployment", "Browser", "File System",
+)
+assert not any(marker.lower() in compact_system_prompt.lower() for marker in _AGENT_ONLY_MARKERS), \
+    "compact_system_prompt must not carry agent, tool or Manus sections"
+
+
+
+# Model used by each /search provider
+SEARCH_MODELS = {
+    "bedrock": "us.anthropic.claude-3-7-sonnet-20250219-v1:0",
+    "openrouter": "deepseek-ai/deepseek-coder-33b-instruct",
+    "openai": "gpt-3.5-turbo",
+}
+SEARCH_TEMPERATURE = 0.7
+SEARCH_MAX_TOKENS = 2500
+
+# Identical /search requests in flight at the same time share one call
+_search_flight = SingleFlight()
+
+_bedrock_client = None
+_bedrock_lock = threading.Lock()
+
+
+def get_bedrock_client():
+    """
+    Return the process-wide Bedrock runtime client. Credentials and the
+    endpoint are resolved once and connections stay pooled between requests.
+    """
+    global _bedrock_client
+    if _bedrock_client is None:
+        with _bedrock_lock:
+            if _bedrock_client is None:
+                _bedrock_client = boto3.client(
+                    service_name="bedrock-runtime",
+                    region_name=aws_region_name,
+                    aws_access_key_id=aws_access_key_id,
+                    aws_secret_access_key=aws_secret_access_key,
+                    config=BotoConfig(
+                        max_pool_connections=CFG.bedrock_max_connections,
+                        tcp_keepalive=True,
+                        read_timeout=CFG.bedrock_read_timeout,
+                        retries={"max_attempts": 3, "mode": "adaptive"},
+                    ),
+                )
+    return _bedrock_client
+
+
+def search_system_prompt():
+    """The system prompt variant selected by SEARCH_PROMPT_VARIANT."""
+    return system_prompt if CFG.search_prompt_variant == "full" else compact_system_prompt
+
+
+_prompt_tokens_saved = None
+
+
+def prompt_tokens_saved():
+    """Input tokens the selected prompt variant saves over the full prompt."""
+    global _prompt_tokens_saved
+    if _prompt_tokens_saved is None:
+        _prompt_tokens_saved = count_tokens(system_prompt) - count_tokens(search_system_prompt())
+    return _prompt_tokens_saved
+
+
+def bedrock_request_body(query):
+    """
+    JSON body of an Anthropic messages request to Bedrock. The system prompt
+    is an identical prefix on every call, so it is marked for prompt caching.
+    """
+    system_block = {"type": "text", "text": search_system_prompt()}
+    if CFG.bedrock_prompt_cache:
+        system_block["cache_control"] = {"type": "ephemeral"}
+    return json.dumps({
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": SEARCH_MAX_TOKENS,
+        "temperature": SEARCH_TEMPERATURE,
+        "system": [system_block],
+        "messages": [
+            {
+                "role": "user",
+                "content": [{"type": "text", "text": query}]
+            }
+        ]
+    })
+
+
+def chat_messages(query):
+    """LangChain messages for a /search query on OpenAI-compatible providers."""
+    return [SystemMessage(content=search_system_prompt()), HumanMessage(content=query)]
+
+
+def record_bedrock_usage(usage, started, first_token_at=None):
+    """Record Anthropic usage, whose input_tokens exclude cached prompt tokens."""
+    usage = usage or {}
+    cache_read = usage.get("cache_read_input_tokens") or 0
+    cache_write = usage.get("cache_creation_input_tokens") or 0
+    _record_usage("bedrock", (usage.get("input_tokens") or 0) + cache_read + cache_write,
+                  usage.get("output_tokens") or 0, cache_read, cache_write, started, first_token_at)
+
+
+def record_langchain_usage(model_provider, usage_metadata, started, first_token_at=None):
+    """Record LangChain usage metadata, whose input_tokens include cached tokens."""
+    usage = usage_metadata or {}
+    details = usage.get("input_token_details") or {}
+    _record_usage(model_provider, usage.get("input_tokens") or 0, usage.get("output_tokens") or 0,
+                  details.get("cache_read") or 0, details.get("cache_creation") or 0, started, first_token_at)
+
+
+def _record_usage(provider, input_tokens, output_tokens, cache_read, cache_write, started, first_token_at):
+    now = time.perf_counter()
+    get_search_usage().record(SearchUsage(
+        provider,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cache_read_tokens=cache_read,
+        cache_write_tokens=cache_write,
+        latency=now - started,
+        first_token_latency=first_token_at - started if first_token_at is not None else None,
+        prompt_tokens_saved=prompt_tokens_saved(),
+    ))
 
 
 def get_llm(model_provider):
     """Returns the appropriate LLM based on the selected provider."""
     if model_provider == "openai":
         return ChatOpenAI(
-            model_name="gpt-3.5-turbo", 
-            openai_api_key=openai_api_key
+            model_name=SEARCH_MODELS["openai"], 
+            openai_api_key=openai_api_key,
+            stream_usage=True
         )
     elif model_provider == "openrouter":
         return ChatOpenAI(
-            model_name="deepseek-ai/deepseek-coder-33b-instruct",
+            model_name=SEARCH_MODELS["openrouter"],
             openai_api_key=openrouter_api_key,
-            openai_api_base="https://openrouter.ai/api/v1"
+            openai_api_base="https://openrouter.ai/api/v1",
+            stream_usage=True
         )
     else:
         return ChatOpenAI(
-            model_name="gpt-3.5-turbo", 
-            openai_api_key=openai_api_key
+            model_name=SEARCH_MODELS["openai"], 
+            openai_api_key=openai_api_key,
+            stream_usage=True
         )
 
 
 
-def llm_serch_function(query, model_provider="bedrock"):
-    """Processes the query using the selected LLM provider and returns the response."""
+def llm_serch_function(query, model_provider="bedrock", use_cache=True):
+    """Processes the query using the selected LLM provider and returns the response.
+    Repeated queries are answered from the exact-match response cache, and
+    paraphrases of earlier queries from the semantic cache, unless
+    `use_cache` is False. Concurrent calls with the same query (ignoring
+    case and whitespace) and provider wait for and share a single upstream call.
+    """
+    key = (query_key(query), model_provider, bool(use_cache))
+    return _search_flight.do(key, _llm_serch_function, query, model_provider, use_cache)
+
+
+def coalesced_searches():
+    """Number of /search calls answered by an identical call already in flight."""
+    return _search_flight.shared
+
+
+def _llm_serch_function(query, model_provider, use_cache):
+    if not use_cache:
+        return _llm_search(query, model_provider)
+
+    cached = _cached_answer(query, model_provider)
+    if cached is not None:
+        return cached
+
+    result = _llm_search(query, model_provider)
+    _store_answer(query, model_provider, result)
+    return result
+
+
+def llm_search_stream(query, model_provider="bedrock", use_cache=True):
+    """Streaming version of llm_serch_function; yields the answer in text pieces.
+    A cached answer is yielded whole. Only complete answers are cached.
+    """
+    if use_cache:
+        cached = _cached_answer(query, model_provider)
+        if cached is not None:
+            yield cached
+            return
+
+    pieces = []
+    stream = _llm_search_stream(query, model_provider)
+    while True:
+        try:
+            piece = next(stream)
+        except StopIteration as stop:
+            complete = stop.value
+            break
+        pieces.append(piece)
+        yield piece
+    # A provider that failed mid-answer leaves a truncated text; don't cache it
+    if use_cache and complete:
+        _store_answer(query, model_provider, "".join(pieces))
+
+
+def _search_cache_key(query, model_provider):
+    return make_cache_key(
+        model_provider,
+        SEARCH_MODELS.get(model_provider, SEARCH_MODELS["openai"]),
+        [search_system_prompt(), query],
+        temperature=SEARCH_TEMPERATURE,
+    )
+
+
+def _cached_answer(query, model_provider):
+    """Look the query up in the exact-match cache, then the semantic cache."""
+    cache = get_llm_cache()
+    cached = cache.get(_search_cache_key(query, model_provider)) if cache else None
+    if cached is not None:
+        return cached
+
+    semantic_cache = get_semantic_cache()
+    if semantic_cache is not None:
+        return semantic_cache.lookup(query, model_provider)
+    return None
+
+
+def _store_answer(query, model_provider, result):
+    if not result:
+        return
+    cache = get_llm_cache()
+    if cache is not None:
+        cache.put(_search_cache_key(query, model_provider), result)
+    semantic_cache = get_semantic_cache()
+    if semantic_cache is not None:
+        semantic_cache.add(query, model_provider, result)
+
+
+def available_providers():
+    """Providers with credentials configured, in the original fallback order."""
+    providers = []
+    if aws_region_name:
+        providers.append("bedrock")
+    if openrouter_api_key:
+        providers.append("openrouter")
+    if openai_api_key:
+        providers.append("openai")
+    return providers
+
+
+def _llm_search(query, model_provider):
+    """
+    Runs the query through the provider router: the selected provider first,
+    hedged on or failing over to the other configured providers.
+    """
+    primary = model_provider if model_provider in SEARCH_MODELS else "openai"
+    provider, result = get_provider_router().call(
+        primary, available_providers(), _search_provider, query
+    )
+    if provider is not None and provider != primary:
+        print(f"/search answered by {provider} instead of {primary}")
+    return result
+
+
+def _search_provider(model_provider, query):
+    """Runs the query on one provider, without fallback."""
+    started = time.perf_counter()
     if model_provider == "bedrock":
-        bedrock_client = boto3.client(
-            service_name="bedrock-runtime",
-            region_name=aws_region_name,
-            aws_access_key_id=aws_access_key_id,
-            aws_secret_access_key=aws_secret_access_key
+        response = get_bedrock_client().invoke_model(
+            modelId=SEARCH_MODELS["bedrock"],
+            body=bedrock_request_body(query),
+            contentType="application/json"
         )
-  
-        playload= {
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 2500,
-            "temperature": 0.7,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [{"type": "text", "text": system_prompt}]
-                },
-                {
-                    "role": "user",
-                    "content": [{"type": "text", "text": query}]
-                }
-            ]
-        }
-        request = json.dumps(playload)
-        
+        response_body = json.loads(response["body"].read())
+        record_bedrock_usage(response_body.get("usage"), started)
+        return response_body["content"][0]["text"]
+
+    response = get_llm(model_provider).invoke(chat_messages(query))
+    record_langchain_usage(model_provider, response.usage_metadata, started)
+    return response.content
+
+
+def _llm_search_stream(query, model_provider):
+    """
+    Streams the query on the selected provider. A provider that fails before
+    sending any text falls back to OpenAI, like _llm_search.
+
+    Returns True when the answer finished, False when the provider failed
+    after part of it had been yielded.
+    """
+    if model_provider == "bedrock":
+        started, first_token_at, usage = time.perf_counter(), None, {}
         try:
-            response = bedrock_client.invoke_model(
-                modelId="us.anthropic.claude-3-7-sonnet-20250219-v1:0",
-                body=request,
+            response = get_bedrock_client().invoke_model_with_response_stream(
+                modelId=SEARCH_MODELS["bedrock"],
+                body=bedrock_request_body(query),
                 contentType="application/json"
             )
-            response_body = json.loads(response["body"].read())
-            return response_body["content"][0]["text"]
+            for event in response["body"]:
+                chunk = json.loads(event["chunk"]["bytes"]) if "chunk" in event else {}
+                if chunk.get("type") == "message_start":
+                    usage.update(chunk["message"].get("usage") or {})
+                elif chunk.get("type") == "message_delta":
+                    usage.update(chunk.get("usage") or {})
+                elif chunk.get("type") == "content_block_delta" and chunk["delta"].get("text"):
+                    first_token_at = first_token_at or time.perf_counter()
+                    yield chunk["delta"]["text"]
+            record_bedrock_usage(usage, started, first_token_at)
+            return True
         except Exception as e:
-            print(f"Error invoking Bedrock model: {str(e)}")
-            # Fall back to OpenAI if Bedrock fails
-            model_provider = "openai"
+            print(f"Error streaming Bedrock model: {str(e)}")
+            if first_token_at is not None:
+                return False
     elif model_provider == "openrouter":
+        stream = _langchain_stream("openrouter", query)
         try:
-            llm = get_llm("openrouter")
-            response = llm.invoke([
-                HumanMessage(content=system_prompt),
-                HumanMessage(content=query)
-            ])
-            return response.content
+            first = next(stream, None)
         except Exception as e:
-            print(f"Error invoking OpenRouter model: {str(e)}")
-            # Fall back to OpenAI
-            model_provider = "openai"
-    
-    # If not Bedrock/OpenRouter or if they failed, use OpenAI    
-    llm = get_llm("openai")
-    response = llm.invoke([
-        HumanMessage(content=system_prompt),
-        HumanMessage(content=query)
-    ])
-    return response.content
-
-
-    
\ No newline at end of file
+            print(f"Error streaming OpenRouter model: {str(e)}")
+        else:
+            if first is not None:
+                yield first
+                try:
+                    yield from stream
+                except Exception as e:
+                    print(f"Error streaming OpenRouter model: {str(e)}")
+                    return False
+            return True
+
+    yield from _langchain_stream("openai", query)
+    return True
+
+
+def _langchain_stream(model_provider, query):
+    started, first_token_at, usage_metadata = time.perf_counter(), None, None
+    for chunk in get_llm(model_provider).stream(chat_messages(query)):
+        if chunk.usage_metadata:
+            usage_metadata = chunk.usage_metadata
+        if chunk.content:
+            first_token_at = first_token_at or time.perf_counter()
+            yield chunk.content
+    record_langchain_usage(model_provider, usage_metadata, started, first_token_at)
@@ -1,111 +1,271 @@
 from config import Config
-import openai
-import tiktoken
+import asyncio
+import httpx
 import time
+import weakref
+from openai import AsyncOpenAI
 
-CFG = Config()
+from agent.llm_cache import get_llm_cache, make_cache_key
+from agent.tokenizer import (
+    MESSAGE_OVERHEAD_TOKENS,
+    count_message_tokens,
+    count_tokens,
+    input_token_budget,
+    truncate_to_tokens,
+)
 
-# Set up OpenAI client in the compatible way
-openai.api_key = CFG.openai_api_key
-#openai.api_base = CFG.openai_api_base
+CFG = Config()
 
 from typing import Optional
 
-def count_tokens(text, model="gpt-3.5-turbo"):
-    """Count the number of tokens in a text string."""
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-        return len(encoding.encode(text))
-    except:
-        # Fallback: estimate tokens (1 token ~= 4 chars for English)
-        return len(text) // 4
-
-def check_token_limit(messages, model="gpt-3.5-turbo"):
-    """Check if messages exceed token limit and truncate if necessary."""
-    # Set limits based on model
-    if "gpt-4" in model:
-        limit = 6000  # Conservative limit for GPT-4 context window
-    else:
-        limit = 3000  # Conservative limit for GPT-3.5 context window
-    
-    # Count tokens in all messages
-    total_tokens = 0
-    for msg in messages:
-        total_tokens += count_tokens(msg["content"])
-    
-    # Return true if within limit
-    return total_tokens <= limit
-
-def llm_response(model, 
-             messages, 
+# One AsyncOpenAI client per event loop: httpx async connections cannot be
+# shared between loops.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    """Return the pooled synchronous OpenAI client created by Config."""
+    if CFG.client is None:
+        raise RuntimeError("OPENAI_API_KEY is not set")
+    return CFG.client
+
+
+def get_async_client():
+    """Return the pooled AsyncOpenAI client for the running event loop."""
+    if not CFG.openai_api_key:
+        raise RuntimeError("OPENAI_API_KEY is not set")
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncOpenAI(
+            api_key=CFG.openai_api_key,
+            timeout=CFG.llm_timeout,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=CFG.llm_max_connections,
+                    max_keepalive_connections=CFG.llm_max_connections,
+                ),
+                timeout=CFG.llm_timeout,
+            ),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def check_token_limit(messages, model=None, max_tokens=None):
+    """Check whether the messages fit in the model's input token budget."""
+    model = model or CFG.fast_llm_model
+    return count_message_tokens(messages, model) <= input_token_budget(model, max_tokens)
+
+def fit_messages(messages, model, max_tokens=None):
+    """Truncate the last user message in place if the messages exceed the token budget."""
+    if check_token_limit(messages, model, max_tokens):
+        return messages
+    # If user message is too long, truncate it
+    if len(messages) >= 2 and messages[-1]["role"] == "user":
+        content = messages[-1]["content"]
+        available = input_token_budget(model, max_tokens) - count_message_tokens(messages[:-1], model) \
+            - MESSAGE_OVERHEAD_TOKENS - 16
+        truncated = truncate_to_tokens(content, available, model)
+        # Find last complete sentence
+        last_period = max(truncated.rfind('.'), truncated.rfind('!'), truncated.rfind('?'))
+        if last_period > len(truncated) * 0.75:
+            truncated = truncated[:last_period+1]
+        messages[-1]["content"] = truncated + " [TRUNCATED FOR TOKEN LIMIT]"
+        print(f"Input truncated from {len(content)} to {len(messages[-1]['content'])} characters")
+    return messages
+
+
+# Start of the reply returned instead of raising when a completion fails
+ERROR_REPLY_PREFIX = "I encountered an error processing your request."
+
+
+def _error_reply(e):
+    return f"{ERROR_REPLY_PREFIX} Please try with a shorter or simpler query. Error: {str(e)}"
+
+
+def _cache_lookup(use_cache, model, messages, temperature, max_tokens):
+    """Return (cache, key, cached response) for an OpenAI completion."""
+    cache = get_llm_cache() if use_cache else None
+    if cache is None:
+        return None, None, None
+    key = make_cache_key("openai", model, messages, temperature=temperature, max_tokens=max_tokens)
+    return cache, key, cache.get(key)
+
+
+def llm_response(model,
+             messages,
              temperature: float = CFG.temperature,
              max_tokens: Optional[int] = None,
-             retry_count: int = 3):
-    
+             retry_count: int = 3,
+             use_cache: bool = True):
+
     # Check if current messages exceed token limit
-    if not check_token_limit(messages, model):
-        # If user message is too long, truncate it
-        if len(messages) >= 2 and messages[-1]["role"] == "user":
-            content = messages[-1]["content"]
-            # Try to find a logical truncation point
-            # Estimate safe length (3000 tokens ≈ 12000 chars)
-            safe_length = 12000 
-            if len(content) > safe_length:
-                truncated = content[:safe_length]
-                # Find last complete sentence
-                last_period = max(truncated.rfind('.'), truncated.rfind('!'), truncated.rfind('?'))
-                if last_period > 0:
-                    messages[-1]["content"] = truncated[:last_period+1] + " [TRUNCATED FOR TOKEN LIMIT]"
-                else:
-                    messages[-1]["content"] = truncated + " [TRUNCATED FOR TOKEN LIMIT]"
-                print(f"Input truncated from {len(content)} to {len(messages[-1]['content'])} characters")
-    
+    fit_messages(messages, model, max_tokens)
+
+    cache, key, cached = _cache_lookup(use_cache, model, messages, temperature, max_tokens)
+    if cached is not None:
+        return cached
+
     # Try to generate a response with retries
     for attempt in range(retry_count):
         try:
-            response = openai.ChatCompletion.create(
+            response = get_client().chat.completions.create(
                 model=model,
                 messages=messages,
                 temperature=temperature,
                 max_tokens=max_tokens,
             )
-            return response.choices[0].message["content"]
+            content = response.choices[0].message.content
+            if cache is not None and content:
+                cache.put(key, content)
+            return content
         except Exception as e:
             print(f"Error in LLM response: {str(e)}")
             if attempt < retry_count - 1:
                 print(f"Retrying in {2 ** attempt} seconds...")
                 time.sleep(2 ** attempt)
             else:
-                return f"I encountered an error processing your request. Please try with a shorter or simpler query. Error: {str(e)}"
+                return _error_reply(e)
 
 
-def llm_stream_response(model, 
-                        messages, 
-                        temperature: float = CFG.temperature, 
-                        max_tokens: Optional[int] = None):
-    response = ""
-    
+async def allm_response(model,
+                        messages,
+                        temperature: float = CFG.temperature,
+                        max_tokens: Optional[int] = None,
+                        retry_count: int = 3,
+                        use_cache: bool = True):
+    """Asyncio version of llm_response; overlapping calls share pooled connections."""
+    fit_messages(messages, model, max_tokens)
+
+    cache, key, cached = _cache_lookup(use_cache, model, messages, temperature, max_tokens)
+    if cached is not None:
+        return cached
+
+    for attempt in range(retry_count):
+        try:
+            response = await get_async_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+            )
+            content = response.choices[0].message.content
+            if cache is not None and content:
+                cache.put(key, content)
+            return content
+        except Exception as e:
+            print(f"Error in LLM response: {str(e)}")
+            if attempt < retry_count - 1:
+                print(f"Retrying in {2 ** attempt} seconds...")
+                await asyncio.sleep(2 ** attempt)
+            else:
+                return _error_reply(e)
+
+
+def _usage_dict(usage):
+    if usage is None:
+        return None
+    return {
+        "prompt_tokens": usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+        "total_tokens": usage.total_tokens,
+    }
+
+
+def _stream_error_message(e):
+    return f"\n\nI apologize, but I encountered an error: {str(e)}\nPlease try again with a shorter query."
+
+
+def llm_stream_deltas(model,
+                      messages,
+                      temperature: float = CFG.temperature,
+                      max_tokens: Optional[int] = None):
+    """
+    Stream a completion as events carrying only new content.
+
+    Yields {"type": "delta", "content": str} for each piece of text, then a
+    single {"type": "done", "finish_reason": str, "usage": dict or None}.
+    On errors the message is sent as a final delta and finish_reason is "error".
+    """
     # Ensure messages don't exceed token limit
-    if not check_token_limit(messages, model):
-        # Truncate user message if needed
-        if len(messages) >= 2 and messages[-1]["role"] == "user":
-            messages[-1]["content"] = messages[-1]["content"][:12000] + " [TRUNCATED]"
-    
+    fit_messages(messages, model, max_tokens)
+
+    finish_reason, usage = None, None
     try:
-        for chunk in openai.ChatCompletion.create(
+        for chunk in get_client().chat.completions.create(
                 model=model,
                 messages=messages,
                 temperature=temperature,
                 max_tokens=max_tokens,
                 stream=True,
+                stream_options={"include_usage": True},
         ):
-            content = chunk["choices"][0]["delta"].get("content")
-            if content is not None:
-                response += content
-                yield response
+            if chunk.usage is not None:
+                usage = _usage_dict(chunk.usage)
+            for choice in chunk.choices:
+                if choice.delta.content:
+                    yield {"type": "delta", "content": choice.delta.content}
+                if choice.finish_reason:
+                    finish_reason = choice.finish_reason
     except Exception as e:
-        error_msg = f"\n\nI apologize, but I encountered an error: {str(e)}\nPlease try again with a shorter query."
-        response += error_msg
-        yield response
+        yield {"type": "delta", "content": _stream_error_message(e)}
+        finish_reason = "error"
+    yield {"type": "done", "finish_reason": finish_reason, "usage": usage}
+
 
+async def allm_stream_deltas(model,
+                             messages,
+                             temperature: float = CFG.temperature,
+                             max_tokens: Optional[int] = None):
+    """Asyncio version of llm_stream_deltas."""
+    fit_messages(messages, model, max_tokens)
+
+    finish_reason, usage = None, None
+    try:
+        stream = await get_async_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        async for chunk in stream:
+            if chunk.usage is not None:
+                usage = _usage_dict(chunk.usage)
+            for choice in chunk.choices:
+                if choice.delta.content:
+                    yield {"type": "delta", "content": choice.delta.content}
+                if choice.finish_reason:
+                    finish_reason = choice.finish_reason
+    except Exception as e:
+        yield {"type": "delta", "content": _stream_error_message(e)}
+        finish_reason = "error"
+    yield {"type": "done", "finish_reason": finish_reason, "usage": usage}
 
+
+def llm_stream_response(model,
+                        messages,
+                        temperature: float = CFG.temperature,
+                        max_tokens: Optional[int] = None):
+    """Yield the accumulated response after every chunk.
+    Kept for compatibility; prefer llm_stream_deltas for long outputs.
+    """
+    response = ""
+    for event in llm_stream_deltas(model, messages, temperature, max_tokens):
+        if event["type"] == "delta":
+            response += event["content"]
+            yield response
+
+
+async def allm_stream_response(model,
+                               messages,
+                               temperature: float = CFG.temperature,
+                               max_tokens: Optional[int] = None):
+    """Asyncio version of llm_stream_response."""
+    response = ""
+    async for event in allm_stream_deltas(model, messages, temperature, max_tokens):
+        if event["type"] == "delta":
+            response += event["content"]
+            yield response
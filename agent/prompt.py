@@ -365,6 +365,30 @@ def generate_subtopic_queries_prompt(question):
     Consider different perspectives, approaches, or dimensions of the topic.
     """
 
+def generate_source_notes_prompt(question, sources_text):
+    """Generate the map-step prompt that condenses a batch of sources into notes.
+    Args:
+        question (str): The main research question.
+        sources_text (str): The source-tagged text of the batch.
+    Returns:
+        str: The source notes prompt.
+    """
+    return f"""
+You are condensing research material for a report on: "{question}"
+
+SOURCES:
+{sources_text}
+
+YOUR TASK:
+Write dense research notes covering everything in these sources that is relevant to the question.
+- Keep concrete facts, figures, dates, names, definitions and examples
+- Note disagreements between sources and any stated limitations
+- Tag every note with the source it came from, e.g. [Source 3]
+- Skip navigation text, boilerplate and anything unrelated to the question
+
+Return only the notes as a bulleted Markdown list.
+"""
+
 def generate_deep_research_prompt(topic, research_summary, extra_prompt=""):
     return f"""
     ## Comprehensive Doctoral-Level Research Analysis: "{topic}"
@@ -0,0 +1,214 @@
+"""Latency-aware routing of /search completions across LLM providers."""
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from config import Config
+
+CFG = Config()
+
+
+class ProviderStats:
+    """Sliding window of one provider's latencies and outcomes."""
+
+    def __init__(self, window):
+        self._lock = threading.Lock()
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        # Answers this provider served when it was not the requested one
+        self.hedges_won = 0
+
+    def record(self, latency, ok):
+        with self._lock:
+            self.requests += 1
+            self.outcomes.append(ok)
+            if ok:
+                self.latencies.append(latency)
+            else:
+                self.errors += 1
+
+    def percentile(self, p):
+        with self._lock:
+            ordered = sorted(self.latencies)
+        if not ordered:
+            return None
+        return ordered[min(int(p * len(ordered)), len(ordered) - 1)]
+
+    def record_hedge_win(self):
+        with self._lock:
+            self.hedges_won += 1
+
+    def error_rate(self):
+        with self._lock:
+            outcomes = list(self.outcomes)
+        return outcomes.count(False) / len(outcomes) if outcomes else 0.0
+
+    def as_dict(self, percentile):
+        with self._lock:
+            counts = {"requests": self.requests, "errors": self.errors, "hedges_won": self.hedges_won}
+        return {
+            "requests": counts["requests"],
+            "errors": counts["errors"],
+            "error_rate": round(self.error_rate(), 3),
+            "p50_latency": self.percentile(0.5),
+            f"p{int(percentile * 100)}_latency": self.percentile(percentile),
+            "hedges_won": counts["hedges_won"],
+        }
+
+
+class ProviderRouter:
+    """
+    Runs a call on the requested provider and hedges it on the next best one.
+
+    If the first provider has not answered after its `hedge_percentile`
+    latency (or `default_delay` until `min_samples` calls are recorded), the
+    same call is started on another provider and the first good answer wins.
+    A failed call starts the next provider at once. Providers whose recent
+    error rate exceeds `max_error_rate` are hedged immediately and ranked last.
+    Calls still running when an answer arrives are abandoned: their results
+    are discarded, but their latency is still recorded. A blocking provider
+    call cannot be interrupted, so abandoned calls run until the provider
+    client's own timeout; while `max_abandoned` of them are in flight no new
+    hedges are started, which keeps them from filling the worker pool.
+    """
+
+    def __init__(self, hedging=None, hedge_percentile=None, default_delay=None, min_samples=None,
+                 max_error_rate=None, window=200, max_workers=None, max_abandoned=None):
+        self.hedging = CFG.router_hedging if hedging is None else hedging
+        self.hedge_percentile = CFG.router_hedge_percentile if hedge_percentile is None else hedge_percentile
+        self.default_delay = CFG.router_hedge_delay if default_delay is None else default_delay
+        self.min_samples = CFG.router_min_samples if min_samples is None else min_samples
+        self.max_error_rate = CFG.router_max_error_rate if max_error_rate is None else max_error_rate
+        self.max_abandoned = CFG.router_max_abandoned if max_abandoned is None else max_abandoned
+        self.window = window
+        self._stats = {}
+        self._lock = threading.Lock()
+        self.abandoned = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or CFG.router_workers, thread_name_prefix="provider"
+        )
+
+    def _provider_stats(self, provider):
+        with self._lock:
+            if provider not in self._stats:
+                self._stats[provider] = ProviderStats(self.window)
+            return self._stats[provider]
+
+    def _healthy(self, provider):
+        stats = self._provider_stats(provider)
+        return len(stats.outcomes) < self.min_samples or stats.error_rate() <= self.max_error_rate
+
+    def hedge_delay(self, provider):
+        """Seconds to wait for `provider` before hedging on another one (None: never)."""
+        if not self.hedging:
+            return None
+        if not self._healthy(provider):
+            return 0.0
+        stats = self._provider_stats(provider)
+        if len(stats.latencies) < self.min_samples:
+            return self.default_delay
+        return stats.percentile(self.hedge_percentile)
+
+    def rank(self, primary, providers):
+        """The primary first, then healthy providers by median latency, then unhealthy ones."""
+        def key(provider):
+            median = self._provider_stats(provider).percentile(0.5)
+            return (not self._healthy(provider), median if median is not None else self.default_delay)
+        return [primary] + sorted((p for p in providers if p != primary), key=key)
+
+    def _abandon(self, future):
+        """Count a losing call that could not be cancelled until it finishes."""
+        if future.cancel():
+            return
+        with self._lock:
+            self.abandoned += 1
+        future.add_done_callback(self._abandoned_done)
+
+    def _abandoned_done(self, future):
+        with self._lock:
+            self.abandoned -= 1
+
+    def _can_hedge(self):
+        with self._lock:
+            return self.abandoned < self.max_abandoned
+
+    def _timed(self, provider, fn, args):
+        started = time.perf_counter()
+        try:
+            result = fn(provider, *args)
+        except Exception:
+            self._provider_stats(provider).record(time.perf_counter() - started, False)
+            raise
+        self._provider_stats(provider).record(time.perf_counter() - started, bool(result))
+        return result
+
+    def call(self, primary, providers, fn, *args):
+        """
+        Return (provider, result) from the first provider whose `fn(provider, *args)`
+        returns a non-empty result. Raises the last error if every provider fails.
+        """
+        pending = self.rank(primary, providers)
+        running = {}
+        last_error = None
+
+        def launch():
+            provider = pending.pop(0)
+            running[self._executor.submit(self._timed, provider, fn, args)] = provider
+
+        launch()
+        held_back = False
+        while running:
+            hedge_in = self.hedge_delay(running[next(iter(running))]) if pending and len(running) == 1 else None
+            if held_back and hedge_in is not None:
+                # Check again shortly whether the abandoned calls have ended
+                hedge_in = max(hedge_in, 0.25)
+            done, _ = wait(running, timeout=hedge_in, return_when=FIRST_COMPLETED)
+            if not done:
+                if self._can_hedge():
+                    print(f"Hedging /search on {pending[0]} after {hedge_in:.2f}s")
+                    launch()
+                elif not held_back:
+                    print(f"Not hedging /search: {self.abandoned} abandoned calls still running")
+                    held_back = True
+                continue
+            for future in done:
+                provider = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Provider {provider} failed: {str(e)}")
+                    last_error = e
+                    result = None
+                if result:
+                    for other in running:
+                        self._abandon(other)
+                    if provider != primary:
+                        self._provider_stats(provider).record_hedge_win()
+                    return provider, result
+                if pending:
+                    launch()
+        if last_error is not None:
+            raise last_error
+        return None, None
+
+    def stats(self):
+        with self._lock:
+            providers = dict(self._stats)
+        return {name: stats.as_dict(self.hedge_percentile) for name, stats in providers.items()}
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_provider_router():
+    """Return the process-wide provider router."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ProviderRouter()
+    return _router
@@ -1,17 +1,50 @@
+import asyncio
 import json
 from actions.searxng_search import searxng_search
-from agent.llm_utils import llm_response, llm_stream_response
+from agent.llm_utils import ERROR_REPLY_PREFIX, allm_response, allm_stream_deltas, llm_response, llm_stream_deltas
 from config import Config
 
-from agent.prompt import generate_search_queries_prompt
+from agent.context_packer import ERROR_PREFIXES, pack_context
+from agent.prompt import generate_search_queries_prompt, generate_source_notes_prompt
+from agent.tokenizer import MESSAGE_OVERHEAD_TOKENS, count_tokens, count_tokens_batch, input_token_budget
 from agent import prompt
 from scrapper.beautysoup import extract_clean_text
 from scrapper.pyMupdf import is_pdf_url,extract_pdf_text,process_pdf_url
+from scrapper.extract_pool import run_extraction
+from scrapper.fetcher import SingleFlight, canonicalize_url, get_fetch_engine
+from scrapper.page_cache import cached_get, UnsupportedContentType
 import requests
-import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 
 CFG = Config()
 
+# Closing instructions appended to every report prompt
+REPORT_GUIDANCE = """
+
+Please ensure your report:
+1. Thoroughly covers all subtopics identified in the research
+2. Provides in-depth analysis of each area
+3. Creates a comprehensive, well-structured document
+4. Includes specific examples and evidence from the research
+5. Aims for substantial depth in each section
+"""
+
+# Content types worth handing to the HTML extractor.
+TEXT_CONTENT_TYPES = ("text/", "application/xhtml", "application/xml", "+xml")
+
+# Shared by all Research instances so concurrent sessions draw from one
+# query budget; page fetches are bounded separately by the fetch engine.
+_query_executor = ThreadPoolExecutor(
+    max_workers=CFG.search_query_workers, thread_name_prefix="search-query"
+)
+# Map-step summarization calls of map-reduce reports, shared by all sessions.
+_map_executor = ThreadPoolExecutor(
+    max_workers=CFG.map_concurrency, thread_name_prefix="report-map"
+)
+# One download per canonical URL at a time, across all research sessions.
+_fetch_flight = SingleFlight()
+
 class Research:
     def __init__(self, question, agent, system_prompt, websocket=None, stream_output=None):
         self.question = question
@@ -20,10 +53,28 @@ class Research:
         self.stream_output = stream_output
         self.visited_urls = set()
         self.search_summary = ""
+        # (query, results) pairs kept alongside the text summary
+        self.search_results = []
+        self.context = None
         self.system_prompt = system_prompt
         self.subtopic_data = {}
+        # Canonical URL -> Future with its clean text, so each page is
+        # fetched and parsed once per session.
+        self._url_texts = {}
+        self._url_lock = threading.Lock()
 
-    def call_agent(self, action):
+    def emit(self, event_type, **data):
+        """Sends a progress event to stream_output, if one was given.
+        Called from worker threads as well, so stream_output must be thread-safe.
+        """
+        if self.stream_output is None:
+            return
+        try:
+            self.stream_output({"type": event_type, **data})
+        except Exception as e:
+            print(f"Error streaming {event_type} event: {e}")
+
+    def call_agent(self, action, model=None, use_cache=True):
         messages = [{
             "role": "system",
             "content": self.system_prompt,
@@ -32,11 +83,27 @@ class Research:
             "content": action,
         }]
         return llm_response(
-            model=CFG.fast_llm_model,
+            model=model or CFG.fast_llm_model,
+            messages=messages,
+            use_cache=use_cache,
+        )
+
+    async def acall_agent(self, action, model=None, use_cache=True):
+        messages = [{
+            "role": "system",
+            "content": self.system_prompt,
+        }, {
+            "role": "user",
+            "content": action,
+        }]
+        return await allm_response(
+            model=model or CFG.fast_llm_model,
             messages=messages,
+            use_cache=use_cache,
         )
 
-    def call_agent_stream(self, action):
+    def call_agent_stream(self, action, model=None):
+        """Streams the agent's answer as delta / done events (see llm_stream_deltas)."""
         messages = [{
             "role": "system",
             "content": self.system_prompt,
@@ -44,15 +111,35 @@ class Research:
             "role": "user",
             "content": action,
         }]
-        yield from llm_stream_response(
-            model=CFG.fast_llm_model,
+        yield from llm_stream_deltas(
+            model=model or CFG.fast_llm_model,
             messages=messages
         )
 
+    async def acall_agent_stream(self, action, model=None):
+        """Asyncio version of call_agent_stream."""
+        messages = [{
+            "role": "system",
+            "content": self.system_prompt,
+        }, {
+            "role": "user",
+            "content": action,
+        }]
+        async for event in allm_stream_deltas(
+                model=model or CFG.fast_llm_model,
+                messages=messages):
+            yield event
+
     def create_search_queries(self):
         """ Creates the search queries for the given question. """
-        result = self.call_agent(generate_search_queries_prompt(self.question))
-        
+        return self.parse_search_queries(self.call_agent(generate_search_queries_prompt(self.question)))
+
+    async def acreate_search_queries(self):
+        """Asyncio version of create_search_queries."""
+        return self.parse_search_queries(await self.acall_agent(generate_search_queries_prompt(self.question)))
+
+    def parse_search_queries(self, result):
+        """Parses the model's answer into a {"Q1": query, ...} dict."""
         try:
             # Try to parse as JSON first
             return json.loads(result)
@@ -95,48 +182,109 @@ class Research:
             
             return queries
 
+    def fetch_url_text(self, url):
+        """Downloads a single URL and returns its clean text (or an error note)."""
+        try:
+            if is_pdf_url(url):
+                # Process PDF with our improved method
+                return process_pdf_url(url, keep_file=False)
+            else:
+                # Handle regular HTML pages, reading at most html_max_bytes
+                page = cached_get(
+                    url,
+                    timeout=5,  # Reduced timeout
+                    max_bytes=CFG.html_max_bytes,
+                    truncate=True,
+                    allowed_types=TEXT_CONTENT_TYPES,
+                )
+
+                html = page.text
+                # Parsing is CPU-bound; run it in the extraction process pool
+                text = run_extraction(extract_clean_text, html)
+
+                # Truncate text if too long
+                if len(text) > 5000:
+                    truncated_text = text[:5000]
+                    last_period = truncated_text.rfind('.')
+                    if last_period > 0:
+                        text = truncated_text[:last_period+1]
+                    else:
+                        text = truncated_text
+                return text
+
+        except UnsupportedContentType as e:
+            return f"Skipped non-text content ({e.content_type}): {url}"
+        except requests.exceptions.Timeout:
+            return f"Request timed out for: {url}"
+        except requests.exceptions.RequestException as e:
+            return f"Network error: {e}"
+        except Exception as e:
+            return f"Processing error: {e}"
+
+    def fetch_result(self, result):
+        """Stores the clean text of a search hit on the result.
+        A URL seen earlier in this session reuses that fetch; concurrent
+        fetches of the same URL from other sessions share one download.
+        """
+        url = result.get('url')
+        key = canonicalize_url(url) if url else url
+        with self._url_lock:
+            text_future = self._url_texts.get(key)
+            owner = text_future is None
+            if owner:
+                text_future = Future()
+                self._url_texts[key] = text_future
+        if owner:
+            try:
+                text_future.set_result(_fetch_flight.do(key, self.fetch_url_text, url))
+            except Exception as e:
+                text_future.set_exception(e)
+        result['clean_text'] = text_future.result()
+        self.emit(
+            "source_fetched",
+            url=url,
+            title=result.get('title', 'No Title'),
+            ok=not result['clean_text'].startswith(ERROR_PREFIXES),
+            chars=len(result['clean_text']),
+        )
+        return result
+
     def search_single_query(self, query):
-        """Runs the search for the given query and extracts clean text from each result."""
+        """Runs the search for the given query and extracts clean text from each result.
+        Pages are fetched concurrently by the shared fetch engine, which applies
+        per-host politeness limits; results keep the search engine's order.
+        """
         raw_results = searxng_search(query, max_search_result=10)
-        processed_results = []
-        
-        for result in raw_results:
+        return get_fetch_engine().map(
+            self.fetch_result,
+            raw_results,
+            url_of=lambda result: result.get('url'),
+        )
+
+    async def asearch_single_query(self, query):
+        """Asyncio version of search_single_query. The SearXNG call runs in a
+        worker thread and the page fetches on the shared fetch engine, so the
+        event loop only waits on their futures.
+        """
+        raw_results = await asyncio.to_thread(searxng_search, query, max_search_result=10)
+        engine = get_fetch_engine()
+        return await asyncio.gather(*(
+            asyncio.wrap_future(engine.submit(result.get('url'), self.fetch_result, result))
+            for result in raw_results
+        ))
+
+    def drop_visited(self, results):
+        """Keeps only results whose canonical URL was not already used in this session."""
+        fresh_results = []
+        for result in results:
             url = result.get('url')
-            try:
-                if is_pdf_url(url):
-                    # Process PDF with our improved method
-                    text = process_pdf_url(url, keep_file=False)
-                    result['clean_text'] = text
-                else:
-                    # Handle regular HTML pages
-                    response = requests.get(url, timeout=5)  # Reduced timeout
-                    response.raise_for_status()
-                    
-                    html = response.text
-                    text = extract_clean_text(html)
-                    
-                    # Truncate text if too long
-                    if len(text) > 5000:
-                        truncated_text = text[:5000]
-                        last_period = truncated_text.rfind('.')
-                        if last_period > 0:
-                            text = truncated_text[:last_period+1]
-                        else:
-                            text = truncated_text
-                    result['clean_text'] = text
-            
-            except requests.exceptions.Timeout:
-                result['clean_text'] = f"Request timed out for: {url}"
-            except requests.exceptions.RequestException as e:
-                result['clean_text'] = f"Network error: {e}"
-            except Exception as e:
-                result['clean_text'] = f"Processing error: {e}"
-            
-            processed_results.append(result)
-            # Add a delay between requests to reduce load
-            time.sleep(1.0)
-            
-        return processed_results
+            key = canonicalize_url(url) if url else None
+            if key:
+                if key in self.visited_urls:
+                    continue
+                self.visited_urls.add(key)
+            fresh_results.append(result)
+        return fresh_results
 
     def run_search_summary(self, query):
         """ Runs the search summary for the given query.
@@ -150,14 +298,42 @@ class Research:
     def search_online(self):
         if not self.search_summary:
             self.search_summary += f"=== MAIN QUESTION: {self.question} ===\n\n"
-            search_queries = self.create_search_queries()
-            for _, query in search_queries.items():
-                search_result = self.run_search_summary(query)
+            search_queries = list(self.create_search_queries().values())
+            self.emit("queries_generated", queries=search_queries)
+            # Queries are independent: search them in parallel, join in order.
+            search_results = _query_executor.map(self.run_search_summary, search_queries)
+            for query, search_result in zip(search_queries, search_results):
+                search_result = self.drop_visited(search_result)
+                self.search_results.append((query, search_result))
                 self.search_summary += \
                 f"=Query=:\n{query}\n=Search Result=:\n{search_result}\n================\n"
+            self.emit_extraction_done()
            
         return self.search_summary
 
+    def emit_extraction_done(self):
+        sources = self.sources()
+        usable = [s for s in sources if s.get('clean_text') and not s['clean_text'].startswith(ERROR_PREFIXES)]
+        self.emit("extraction_done", sources=len(sources), usable_sources=len(usable))
+
+    async def asearch_online(self):
+        """Asyncio version of search_online; all queries are searched concurrently."""
+        if not self.search_summary:
+            search_summary = f"=== MAIN QUESTION: {self.question} ===\n\n"
+            search_queries = list((await self.acreate_search_queries()).values())
+            self.emit("queries_generated", queries=search_queries)
+            search_results = await asyncio.gather(*(self.asearch_single_query(query) for query in search_queries))
+            for query, search_result in zip(search_queries, search_results):
+                print(f"Searching for {query}")
+                search_result = self.drop_visited(search_result)
+                self.search_results.append((query, search_result))
+                search_summary += \
+                f"=Query=:\n{query}\n=Search Result=:\n{search_result}\n================\n"
+            self.search_summary = search_summary
+            self.emit_extraction_done()
+
+        return self.search_summary
+
     async def generate_research_report(self, task):
        """Generates a structured research report."""
        research_data = self.search_online()
@@ -175,37 +351,143 @@ class Research:
        report_content = self.call_agent(enhanced_prompt)
        return report_content
 
-    def write_report(self, report_type, extra_prompt=""):
+    def sources(self):
+        """All fetched search results of this session, in query order."""
+        return [result for _, results in self.search_results for result in results]
+
+    def write_report(self, report_type, extra_prompt="", mode=None):
+        """Writes the report, packing raw sources ("pack") or condensing them
+        first ("map_reduce"). `mode` defaults to CFG.report_mode.
+        """
+        if (mode or CFG.report_mode) == "map_reduce":
+            return self.write_report_map_reduce(report_type, extra_prompt)
+
+        return self.call_agent(self.packed_report_prompt(report_type, extra_prompt))
+
+    async def awrite_report(self, report_type, extra_prompt="", mode=None):
+        """Asyncio version of write_report. Searching and the model calls run
+        on the event loop; packing the context runs in a worker thread.
+        """
+        await self.asearch_online()
+        if (mode or CFG.report_mode) == "map_reduce":
+            return await self.awrite_report_map_reduce(report_type, extra_prompt)
+
+        report_prompt = await asyncio.to_thread(self.packed_report_prompt, report_type, extra_prompt)
+        return await self.acall_agent(report_prompt)
+
+    def write_report_stream(self, report_type, extra_prompt=""):
+        """Streams a packed report, yielding only the newly generated text."""
+        for event in self.call_agent_stream(self.packed_report_prompt(report_type, extra_prompt)):
+            if event["type"] == "delta":
+                yield event["content"]
+
+    async def awrite_report_stream(self, report_type, extra_prompt=""):
+        """Asyncio version of write_report_stream."""
+        await self.asearch_online()
+        report_prompt = await asyncio.to_thread(self.packed_report_prompt, report_type, extra_prompt)
+        async for event in self.acall_agent_stream(report_prompt):
+            if event["type"] == "delta":
+                yield event["content"]
+
+    def packed_report_prompt(self, report_type, extra_prompt=""):
+        """Builds the report prompt with the research packed into the token budget."""
         report_type_func = prompt.get_report_by_type(report_type)
-        research_data = self.search_online()
-        
-        # Limit the research data to prevent token limit errors
-        # Estimate: 1 token ~= 4 characters for English text
-        max_tokens = 150000  # Keep well under the 200k limit
-        max_chars = max_tokens * 4
-        
-        if len(research_data) > max_chars:
-            print(f"Truncating research data from {len(research_data)} chars to {max_chars} chars")
-            # Try to cut at a logical boundary
-            truncated_data = research_data[:max_chars]
-            last_boundary = max(
-                truncated_data.rfind("================\n"),
-                truncated_data.rfind("=Search Result=:\n")
-            )
-            if last_boundary > max_chars * 0.75:  # Only use boundary if it's reasonably far in
-                research_data = research_data[:last_boundary] + "\n[TRUNCATED DUE TO TOKEN LIMITS]"
-            else:
-                research_data = truncated_data + "\n[TRUNCATED DUE TO TOKEN LIMITS]"
-        
-        enhanced_prompt = report_type_func(self.question, research_data, extra_prompt) + """
+        self.search_online()
 
-Please ensure your report:
-1. Thoroughly covers all subtopics identified in the research
-2. Provides in-depth analysis of each area
-3. Creates a comprehensive, well-structured document
-4. Includes specific examples and evidence from the research
-5. Aims for substantial depth in each section
-"""
-        return self.call_agent(enhanced_prompt)
+        # Pack the best research chunks into whatever the prompt leaves free
+        # of the model's real input budget
+        model = CFG.fast_llm_model
+        self.context = pack_context(
+            self.question,
+            self.sources(),
+            budget_tokens=self.context_budget(report_type_func, extra_prompt, model),
+            model=model,
+        )
+        print(self.context.summary())
+        self.emit("context_packed", summary=self.context.summary())
+
+        return report_type_func(self.question, self.context.text, extra_prompt) + REPORT_GUIDANCE
+
+    def context_budget(self, report_type_func, extra_prompt, model):
+        """Tokens left for research material once the report prompt itself is counted."""
+        fixed_tokens = count_tokens(
+            self.system_prompt + report_type_func(self.question, "", extra_prompt) + REPORT_GUIDANCE, model
+        ) + 3 * MESSAGE_OVERHEAD_TOKENS
+        return max(input_token_budget(model) - fixed_tokens, 0)
+
+    def source_batches(self, max_tokens):
+        """Groups the usable sources, rendered with their tags, into batches of about `max_tokens`."""
+        rendered = [
+            f"[Source {source_id}: {source.get('title', 'No Title')} ({source.get('url', '#')})]\n{source['clean_text']}\n"
+            for source_id, source in enumerate(self.sources(), start=1)
+            if source.get('clean_text') and not source['clean_text'].startswith(ERROR_PREFIXES)
+        ]
+        batches, current, used = [], [], 0
+        for text, tokens in zip(rendered, count_tokens_batch(rendered, CFG.fast_llm_model)):
+            if current and used + tokens > max_tokens:
+                batches.append("\n".join(current))
+                current, used = [], 0
+            current.append(text)
+            used += tokens
+        if current:
+            batches.append("\n".join(current))
+        return batches
+
+    def write_report_map_reduce(self, report_type, extra_prompt=""):
+        """Condenses batches of sources into notes in parallel with the fast model,
+        then writes the report from the notes with the smart model.
+        """
+        report_type_func = prompt.get_report_by_type(report_type)
+        self.search_online()
+
+        batches = self.source_batches(CFG.map_batch_tokens)
+        print(f"Condensing {len(self.sources())} sources in {len(batches)} batches")
+        notes = list(_map_executor.map(
+            lambda batch: self.call_agent(generate_source_notes_prompt(self.question, batch)),
+            batches,
+        ))
 
+        model = CFG.smart_llm_model
+        return self.call_agent(self.reduce_prompt(report_type_func, notes, extra_prompt, model), model=model)
+
+    async def awrite_report_map_reduce(self, report_type, extra_prompt=""):
+        """Asyncio version of write_report_map_reduce; at most CFG.map_concurrency
+        map calls of this session run at once.
+        """
+        report_type_func = prompt.get_report_by_type(report_type)
+        await self.asearch_online()
+
+        batches = self.source_batches(CFG.map_batch_tokens)
+        print(f"Condensing {len(self.sources())} sources in {len(batches)} batches")
+        limit = asyncio.Semaphore(CFG.map_concurrency)
+
+        async def condense(batch):
+            async with limit:
+                return await self.acall_agent(generate_source_notes_prompt(self.question, batch))
+
+        notes = await asyncio.gather(*(condense(batch) for batch in batches))
+
+        model = CFG.smart_llm_model
+        return await self.acall_agent(self.reduce_prompt(report_type_func, notes, extra_prompt, model), model=model)
+
+    def reduce_prompt(self, report_type_func, notes, extra_prompt, model):
+        """Builds the reduce-step report prompt from the map-step notes.
+
+        Failed map calls are dropped. The notes keep the [Source N] tags of
+        the sources they condense, so they are labelled without source ids.
+        """
+        usable = [note for note in notes if note and not note.startswith(ERROR_REPLY_PREFIX)]
+        if len(usable) < len(notes):
+            print(f"Dropped {len(notes) - len(usable)} of {len(notes)} failed note batches")
+
+        # The notes normally fit; pack them in case a very large run does not
+        self.context = pack_context(
+            self.question,
+            [{"clean_text": note} for note in usable],
+            budget_tokens=self.context_budget(report_type_func, extra_prompt, model),
+            model=model,
+            label="Research notes",
+        )
+        print(self.context.summary())
 
+        return report_type_func(self.question, self.context.text, extra_prompt) + REPORT_GUIDANCE
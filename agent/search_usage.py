@@ -0,0 +1,101 @@
+"""Per-request token and latency accounting for /search."""
+import threading
+import time
+from collections import deque
+
+
+class SearchUsage:
+    """
+    Token usage and timing of one /search completion. `input_tokens` counts
+    the whole prompt, including the parts read from or written to the
+    provider's prompt cache.
+    """
+
+    def __init__(self, provider, input_tokens=0, output_tokens=0, cache_read_tokens=0,
+                 cache_write_tokens=0, latency=0.0, first_token_latency=None, prompt_tokens_saved=0):
+        self.provider = provider
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.cache_read_tokens = cache_read_tokens
+        self.cache_write_tokens = cache_write_tokens
+        self.latency = latency
+        self.first_token_latency = first_token_latency
+        self.prompt_tokens_saved = prompt_tokens_saved
+        self.recorded_at = time.time()
+
+    def summary(self):
+        first_token = f", first token {self.first_token_latency:.2f}s" if self.first_token_latency is not None else ""
+        return (
+            f"/search {self.provider}: {self.input_tokens} input tokens "
+            f"({self.cache_read_tokens} read from the prompt cache, {self.cache_write_tokens} written to it), "
+            f"{self.prompt_tokens_saved} saved by the compact prompt, {self.output_tokens} output tokens, "
+            f"{self.latency:.2f}s{first_token}"
+        )
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def _mean(values):
+    return sum(values) / len(values) if values else None
+
+
+class SearchUsageTracker:
+    """Keeps running totals and the most recent `history` requests."""
+
+    def __init__(self, history=100):
+        self._lock = threading.Lock()
+        self.recent = deque(maxlen=history)
+        self.requests = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_read_tokens = 0
+        self.cache_write_tokens = 0
+        self.prompt_tokens_saved = 0
+
+    def record(self, usage):
+        print(usage.summary())
+        with self._lock:
+            self.recent.append(usage)
+            self.requests += 1
+            self.input_tokens += usage.input_tokens
+            self.output_tokens += usage.output_tokens
+            self.cache_read_tokens += usage.cache_read_tokens
+            self.cache_write_tokens += usage.cache_write_tokens
+            self.prompt_tokens_saved += usage.prompt_tokens_saved
+
+    def stats(self):
+        """Totals plus recent latencies split by whether the prompt cache was hit."""
+        with self._lock:
+            recent = list(self.recent)
+            totals = {
+                "requests": self.requests,
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens,
+                "cache_read_tokens": self.cache_read_tokens,
+                "cache_write_tokens": self.cache_write_tokens,
+                "prompt_tokens_saved": self.prompt_tokens_saved,
+            }
+        input_tokens = totals["input_tokens"]
+        totals["cache_read_ratio"] = totals["cache_read_tokens"] / input_tokens if input_tokens else 0.0
+        totals["avg_latency_cache_hit"] = _mean([u.latency for u in recent if u.cache_read_tokens])
+        totals["avg_latency_cache_miss"] = _mean([u.latency for u in recent if not u.cache_read_tokens])
+        totals["avg_first_token_latency"] = _mean(
+            [u.first_token_latency for u in recent if u.first_token_latency is not None]
+        )
+        totals["recent"] = [u.as_dict() for u in recent[-10:]]
+        return totals
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_search_usage():
+    """Return the process-wide /search usage tracker."""
+    global _tracker
+    if _tracker is None:
+        with _tracker_lock:
+            if _tracker is None:
+                _tracker = SearchUsageTracker()
+    return _tracker
@@ -0,0 +1,200 @@
+"""Semantic answer cache for /search backed by a FAISS index of query embeddings."""
+import atexit
+import json
+import os
+import threading
+import time
+
+from config import Config
+
+CFG = Config()
+
+
+class SemanticCache:
+    """
+    Serves a stored answer when a new query embeds close enough to a cached one.
+
+    Queries are embedded locally on CPU with sentence-transformers and looked
+    up in an inner-product FAISS index over normalized vectors, so scores are
+    cosine similarities. Only answers from the same provider are reused.
+    Entries expire after `ttl` seconds; beyond `max_entries` the least
+    recently used ones are evicted. The index and entries are saved to disk
+    in batches: after `save_every` new answers, `save_interval` seconds after
+    the first unsaved one, and at interpreter exit.
+    """
+
+    def __init__(self, directory=None, threshold=None, max_entries=None, ttl=None, model_name=None,
+                 save_every=None, save_interval=None):
+        import faiss
+        import numpy
+        from sentence_transformers import SentenceTransformer
+
+        self._faiss = faiss
+        self._np = numpy
+        self.directory = directory or os.path.join(CFG.cache_dir, "semantic")
+        self.threshold = CFG.semantic_cache_threshold if threshold is None else threshold
+        self.max_entries = CFG.semantic_cache_max_entries if max_entries is None else max_entries
+        self.ttl = CFG.semantic_cache_ttl if ttl is None else ttl
+        self.save_every = CFG.semantic_cache_save_every if save_every is None else save_every
+        self.save_interval = CFG.semantic_cache_save_interval if save_interval is None else save_interval
+        self.model = SentenceTransformer(model_name or CFG.semantic_cache_model, device="cpu")
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        # The first encode initializes the model's kernels; do it now, not on a request
+        self._embed("warm up")
+
+        self._lock = threading.Lock()
+        # Serializes disk writes, which happen outside self._lock
+        self._save_lock = threading.Lock()
+        self._unsaved = 0
+        self._save_due = threading.Event()
+        self._batch_full = threading.Event()
+        self._index_path = os.path.join(self.directory, "index.faiss")
+        self._entries_path = os.path.join(self.directory, "entries.json")
+        self.entries = {}
+        self.next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self._load()
+        threading.Thread(target=self._save_loop, name="semantic-cache-save", daemon=True).start()
+        atexit.register(self.flush)
+
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self._index_path) and os.path.exists(self._entries_path):
+            try:
+                self.index = self._faiss.read_index(self._index_path)
+                with open(self._entries_path, encoding="utf-8") as f:
+                    data = json.load(f)
+                self.entries = {int(k): v for k, v in data["entries"].items()}
+                self.next_id = data["next_id"]
+                return
+            except Exception as e:
+                print(f"Could not load semantic cache, starting empty: {e}")
+        self.index = self._faiss.IndexIDMap2(self._faiss.IndexFlatIP(self.dimension))
+        self.entries = {}
+        self.next_id = 0
+
+    def flush(self):
+        """Write the index and entries to disk if anything changed since the last save."""
+        with self._save_lock:
+            with self._lock:
+                if not self._unsaved:
+                    return
+                # Snapshot in memory under the lock; the slow disk writes happen after it
+                index_bytes = self._faiss.serialize_index(self.index)
+                entries_json = json.dumps({"next_id": self.next_id, "entries": self.entries})
+                self._unsaved = 0
+            tmp_index = f"{self._index_path}.tmp"
+            tmp_entries = f"{self._entries_path}.tmp"
+            with open(tmp_index, "wb") as f:
+                f.write(index_bytes.tobytes())
+            with open(tmp_entries, "w", encoding="utf-8") as f:
+                f.write(entries_json)
+            os.replace(tmp_index, self._index_path)
+            os.replace(tmp_entries, self._entries_path)
+
+    def _save_loop(self):
+        while True:
+            self._save_due.wait()
+            # Let more answers join the batch, unless it is already full
+            self._batch_full.wait(self.save_interval)
+            self._save_due.clear()
+            self._batch_full.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Could not save semantic cache: {e}")
+
+    def _embed(self, text):
+        return self.model.encode([text], normalize_embeddings=True, convert_to_numpy=True).astype("float32")
+
+    def _remove(self, ids):
+        if ids:
+            self.index.remove_ids(self._np.array(ids, dtype="int64"))
+            for entry_id in ids:
+                self.entries.pop(entry_id, None)
+
+    def lookup(self, query, provider):
+        """Return the cached answer for a near-duplicate query, or None."""
+        vector = self._embed(query)
+        now = time.time()
+        with self._lock:
+            if self.index.ntotal == 0:
+                self.misses += 1
+                return None
+            scores, ids = self.index.search(vector, min(8, self.index.ntotal))
+            for score, entry_id in zip(scores[0], ids[0]):
+                entry = self.entries.get(int(entry_id))
+                if entry is None or score < self.threshold:
+                    continue
+                if entry["provider"] != provider or now - entry["stored_at"] > self.ttl:
+                    continue
+                entry["accessed_at"] = now
+                self.hits += 1
+                return entry["answer"]
+            self.misses += 1
+            return None
+
+    def add(self, query, provider, answer):
+        """Store an answer for `query`; it is written to disk with the next batch."""
+        vector = self._embed(query)
+        now = time.time()
+        with self._lock:
+            entry_id = self.next_id
+            self.next_id += 1
+            self.index.add_with_ids(vector, self._np.array([entry_id], dtype="int64"))
+            self.entries[entry_id] = {
+                "query": query, "provider": provider, "answer": answer,
+                "stored_at": now, "accessed_at": now,
+            }
+            expired = [i for i, e in self.entries.items() if now - e["stored_at"] > self.ttl]
+            self._remove(expired)
+            overflow = len(self.entries) - self.max_entries
+            if overflow > 0:
+                oldest = sorted(self.entries, key=lambda i: self.entries[i]["accessed_at"])[:overflow]
+                self._remove(oldest)
+            self._unsaved += 1
+            if self._unsaved >= self.save_every:
+                self._batch_full.set()
+        self._save_due.set()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+                "unsaved": self._unsaved,
+            }
+
+
+_cache = None
+_cache_failed = False
+_cache_lock = threading.Lock()
+
+
+def get_semantic_cache():
+    """
+    Return the process-wide semantic cache, or None when it is disabled or
+    faiss / sentence-transformers cannot be loaded.
+    """
+    global _cache, _cache_failed
+    if not CFG.semantic_cache_enabled or _cache_failed:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None and not _cache_failed:
+                try:
+                    _cache = SemanticCache()
+                except Exception as e:
+                    print(f"Semantic cache disabled: {e}")
+                    _cache_failed = True
+    return _cache
+
+
+def warm_semantic_cache():
+    """Load the semantic cache and its embedding model in the background at startup."""
+    if CFG.semantic_cache_enabled:
+        threading.Thread(target=get_semantic_cache, name="semantic-cache-load", daemon=True).start()
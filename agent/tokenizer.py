@@ -0,0 +1,159 @@
+"""Cached tokenizers and per-model context / output token budgets."""
+import threading
+import time
+
+import tiktoken
+
+from config import Config
+
+CFG = Config()
+
+# Model name fragment -> (context window, maximum output tokens).
+# The longest fragment contained in the model name wins.
+MODEL_BUDGETS = {
+    "gpt-4.1": (1047576, 32768),
+    "gpt-4o-mini": (128000, 16384),
+    "gpt-4o": (128000, 16384),
+    "gpt-4-turbo": (128000, 4096),
+    "gpt-4-32k": (32768, 4096),
+    "gpt-4": (8192, 4096),
+    "gpt-3.5-turbo-instruct": (4096, 4096),
+    "gpt-3.5-turbo": (16385, 4096),
+    "o1": (200000, 100000),
+    "o3": (200000, 100000),
+    "o4-mini": (200000, 100000),
+    "claude-3-7-sonnet": (200000, 64000),
+    "claude-3": (200000, 8192),
+    "claude": (200000, 8192),
+    "deepseek": (16384, 4096),
+}
+DEFAULT_BUDGET = (8192, 2048)
+
+# Tokens added per chat message for role and separators.
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+
+# Output tokens kept free when the caller does not pass max_tokens.
+DEFAULT_OUTPUT_RESERVE = 4096
+
+# Below this many characters in total, count_tokens_batch encodes the texts
+# one by one; a thread pool only pays off for large batches.
+PARALLEL_MIN_CHARS = 200_000
+
+# Seconds to wait before trying again to load an encoding that failed.
+ENCODING_RETRY_SECONDS = 60
+
+_encodings = {}
+_encoding_retry_at = {}
+_encodings_lock = threading.Lock()
+
+
+def _budget(model):
+    model = (model or "").lower()
+    matches = [fragment for fragment in MODEL_BUDGETS if fragment in model]
+    if not matches:
+        return DEFAULT_BUDGET
+    return MODEL_BUDGETS[max(matches, key=len)]
+
+
+def context_window(model):
+    """Total tokens (input + output) the model accepts."""
+    return _budget(model)[0]
+
+
+def max_output_tokens(model):
+    """Largest completion the model can produce."""
+    return _budget(model)[1]
+
+
+def configured_token_limit(model):
+    """The FAST/SMART_TOKEN_LIMIT that applies to `model`, if any."""
+    if model == CFG.fast_llm_model:
+        return CFG.fast_token_limit
+    if model == CFG.smart_llm_model:
+        return CFG.smart_token_limit
+    return None
+
+
+def input_token_budget(model, max_tokens=None):
+    """
+    Tokens available for the prompt: the context window minus the output
+    reserve, capped by the configured token limit for the model.
+    """
+    reserve = max_tokens or min(DEFAULT_OUTPUT_RESERVE, max_output_tokens(model))
+    budget = max(context_window(model) - reserve, 0)
+    limit = configured_token_limit(model)
+    return min(budget, limit) if limit else budget
+
+
+def _load_encoding(model):
+    if model:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            pass
+    name = "o200k_base" if any(f in (model or "") for f in ("gpt-4o", "gpt-4.1", "o1", "o3", "o4")) else "cl100k_base"
+    return tiktoken.get_encoding(name)
+
+
+def get_encoding(model=None):
+    """
+    Return the (cached) tiktoken encoding for `model`, or None if it cannot
+    be loaded right now. tiktoken downloads its BPE files on first use, so a
+    failure is not cached: loading is tried again after ENCODING_RETRY_SECONDS.
+    """
+    encoding = _encodings.get(model)
+    if encoding is not None:
+        return encoding
+    if time.monotonic() < _encoding_retry_at.get(model, 0):
+        return None
+    with _encodings_lock:
+        if model in _encodings:
+            return _encodings[model]
+        try:
+            encoding = _load_encoding(model)
+        except Exception as e:
+            print(f"Could not load the tokenizer for {model}, estimating token counts: {e}")
+            _encoding_retry_at[model] = time.monotonic() + ENCODING_RETRY_SECONDS
+            return None
+        _encodings[model] = encoding
+        _encoding_retry_at.pop(model, None)
+        return encoding
+
+
+def count_tokens(text, model=None):
+    """Count the number of tokens in a text string."""
+    encoding = get_encoding(model or CFG.fast_llm_model)
+    if encoding is None:
+        # Fallback: estimate tokens (1 token ~= 4 chars for English)
+        return len(text) // 4
+    return len(encoding.encode_ordinary(text))
+
+
+def count_tokens_batch(texts, model=None, num_threads=8):
+    """Count tokens for many texts, encoding them in parallel when there is
+    at least PARALLEL_MIN_CHARS of text."""
+    texts = list(texts)
+    encoding = get_encoding(model or CFG.fast_llm_model)
+    if encoding is None:
+        return [len(text) // 4 for text in texts]
+    if len(texts) < 2 or sum(map(len, texts)) < PARALLEL_MIN_CHARS:
+        return [len(encoding.encode_ordinary(text)) for text in texts]
+    return [len(tokens) for tokens in encoding.encode_ordinary_batch(texts, num_threads=num_threads)]
+
+
+def count_message_tokens(messages, model=None):
+    """Count the prompt tokens of a list of chat messages."""
+    counts = count_tokens_batch([msg["content"] or "" for msg in messages], model)
+    return sum(counts) + MESSAGE_OVERHEAD_TOKENS * len(messages) + REPLY_PRIMING_TOKENS
+
+
+def truncate_to_tokens(text, max_tokens, model=None):
+    """Return the longest prefix of `text` that fits in `max_tokens` tokens."""
+    encoding = get_encoding(model or CFG.fast_llm_model)
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode_ordinary(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max(max_tokens, 0)])
@@ -9,6 +9,7 @@ interface Message {
   content: string;
   searchType?: SearchType;
   model?: string;
+  status?: string;
 }
 
 interface Model {
@@ -109,6 +110,81 @@ const ChatInterface: React.FC = () => {
     };
   }, []);
 
+  const updateLastMessage = (update: Partial<Message>) => {
+    setMessages(prev => {
+      const next = [...prev];
+      next[next.length - 1] = { ...next[next.length - 1], ...update };
+      return next;
+    });
+  };
+
+  // Reads the /reason/stream Server-Sent Events: progress updates first,
+  // then the report as it is written.
+  const streamResearch = async (query: string) => {
+    const response = await fetch('http://localhost:5000/reason/stream', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ 
+        query,
+        model: selectedModel
+      }),
+    });
+
+    if (!response.ok || !response.body) {
+      throw new Error('Network response was not ok');
+    }
+
+    setMessages(prev => [...prev, { 
+      type: 'bot', 
+      content: '',
+      status: 'Planning search queries...',
+      searchType,
+      model: selectedModel
+    }]);
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let report = '';
+    let fetched = 0;
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const frames = buffer.split('\n\n');
+      buffer = frames.pop() || '';
+      for (const frame of frames) {
+        const dataLine = frame.split('\n').find(line => line.startsWith('data: '));
+        if (!dataLine) continue;
+        const event = JSON.parse(dataLine.slice(6));
+        switch (event.type) {
+          case 'queries_generated':
+            updateLastMessage({ status: `Searching ${event.queries.length} queries...` });
+            break;
+          case 'source_fetched':
+            fetched += 1;
+            updateLastMessage({ status: `Read ${fetched} sources...` });
+            break;
+          case 'extraction_done':
+            updateLastMessage({ status: `Writing the report from ${event.usable_sources} sources...` });
+            break;
+          case 'report_delta':
+            report += event.content;
+            updateLastMessage({ content: report });
+            break;
+          case 'done':
+            updateLastMessage({ status: undefined });
+            break;
+          case 'error':
+            updateLastMessage({ status: undefined });
+            throw new Error(event.error);
+        }
+      }
+    }
+  };
+
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
     if (!input.trim() || isLoading) return;
@@ -124,7 +200,12 @@ const ChatInterface: React.FC = () => {
     setIsLoading(true);
 
     try {
-      let endpoint = searchType === 'research' ? '/reason' : '/search';
+      if (searchType === 'research') {
+        await streamResearch(userMessage);
+        return;
+      }
+
+      const endpoint = '/search';
 
       const response = await fetch(`http://localhost:5000${endpoint}`, {
         method: 'POST',
@@ -301,6 +382,9 @@ const ChatInterface: React.FC = () => {
                   <p className="text-sm">{message.content}</p>
                 ) : (
                   <div className="prose prose-sm max-w-none">
+                    {message.status && (
+                      <p className="text-xs text-gray-500 mb-2 animate-pulse">{message.status}</p>
+                    )}
                     <ReactMarkdown 
                       remarkPlugins={[remarkGfm]}
                       components={{
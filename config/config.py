@@ -1,6 +1,5 @@
 """Configuration class to store the state of bools for different scripts access."""
 import os
-from openai import OpenAI
 from colorama import Fore
 from dotenv import load_dotenv
 
@@ -25,6 +24,27 @@ class Config(metaclass=Singleton):
         self.fast_token_limit = int(os.getenv("FAST_TOKEN_LIMIT", 8000))
         self.smart_token_limit = int(os.getenv("SMART_TOKEN_LIMIT", 8000))
         self.browse_chunk_max_length = int(os.getenv("BROWSE_CHUNK_MAX_LENGTH", 8192))
+        # Report mode: "pack" fits raw sources into one prompt, "map_reduce"
+        # condenses batches of sources in parallel with the fast model first.
+        self.report_mode = os.getenv("REPORT_MODE", "pack")
+        self.map_batch_tokens = int(os.getenv("MAP_BATCH_TOKENS", 6000))
+        self.map_concurrency = int(os.getenv("MAP_CONCURRENCY", 8))
+        # Background research jobs: concurrent workers, the cap on queued plus
+        # running jobs, and how long finished jobs are kept (seconds).
+        self.job_workers = int(os.getenv("JOB_WORKERS", 4))
+        self.job_max_unfinished = int(os.getenv("JOB_MAX_UNFINISHED", 100))
+        self.job_retention = int(os.getenv("JOB_RETENTION", 7 * 24 * 3600))
+        # Seconds a finished job's progress events stay in memory for subscribers
+        self.job_events_grace = int(os.getenv("JOB_EVENTS_GRACE", 300))
+        # Admission control for the web API: requests admitted at once per
+        # endpoint group, how many more may wait, and the longest wait (seconds)
+        # before a 503. A full wait queue answers 429 straight away.
+        self.admission_enabled = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+        self.search_max_concurrent = int(os.getenv("SEARCH_MAX_CONCURRENT", 32))
+        self.search_max_queue = int(os.getenv("SEARCH_MAX_QUEUE", 64))
+        self.reason_max_concurrent = int(os.getenv("REASON_MAX_CONCURRENT", 4))
+        self.reason_max_queue = int(os.getenv("REASON_MAX_QUEUE", 16))
+        self.admission_queue_timeout = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 10))
 
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         #self.openai_api_base = os.getenv("OPENAI_API_BASE", openai.api_base)
@@ -37,9 +57,105 @@ class Config(metaclass=Singleton):
         )
 
         self.memory_backend = os.getenv("MEMORY_BACKEND", "local")
-        # Initialize the OpenAI API client
+
+        # Page fetching: global worker count, per-host concurrency and the
+        # minimum spacing (seconds) between two requests to the same host.
+        self.fetch_max_workers = int(os.getenv("FETCH_MAX_WORKERS", 16))
+        self.fetch_per_host_limit = int(os.getenv("FETCH_PER_HOST_LIMIT", 2))
+        self.fetch_host_delay = float(os.getenv("FETCH_HOST_DELAY", "0.5"))
+        # HTML pages are read up to this many bytes; the rest is never downloaded.
+        self.html_max_bytes = int(os.getenv("HTML_MAX_BYTES", 2 * 1024 * 1024))
+        # HTML text extraction backend: auto, selectolax, lxml or bs4.
+        self.extract_backend = os.getenv("EXTRACT_BACKEND", "auto")
+        # HTML/PDF extraction runs in a pool of worker processes. Workers are
+        # recycled after EXTRACT_MAX_TASKS_PER_CHILD jobs and killed when a
+        # job runs past EXTRACT_TIMEOUT seconds.
+        self.extract_pool_enabled = os.getenv("EXTRACT_POOL_ENABLED", "true").lower() == "true"
+        self.extract_workers = int(os.getenv("EXTRACT_WORKERS", os.cpu_count() or 2))
+        self.extract_max_tasks_per_child = int(os.getenv("EXTRACT_MAX_TASKS_PER_CHILD", 200))
+        self.extract_timeout = float(os.getenv("EXTRACT_TIMEOUT", 20))
+        # Large PDFs are split into jobs of this many pages, extracted in parallel.
+        self.pdf_pages_per_job = int(os.getenv("PDF_PAGES_PER_JOB", 10))
+        # Number of generated search queries processed at once, shared by
+        # every research session in the process.
+        self.search_query_workers = int(os.getenv("SEARCH_QUERY_WORKERS", 8))
+        # Shared HTTP connection pool: number of hosts kept pooled and the
+        # maximum number of open connections to any single host.
+        self.http_pool_hosts = int(os.getenv("HTTP_POOL_HOSTS", 32))
+        self.http_per_host_connections = int(os.getenv("HTTP_PER_HOST_CONNECTIONS", 8))
+
+        # On-disk caches live under cache_dir.
+        self.cache_dir = os.getenv("CACHE_DIR", "cache")
+        # Page cache: entries younger than the TTL are served without a
+        # request, older ones are revalidated, unused ones expire after
+        # PAGE_CACHE_MAX_AGE seconds.
+        self.page_cache_enabled = os.getenv("PAGE_CACHE_ENABLED", "true").lower() == "true"
+        self.page_cache_dir = os.getenv("PAGE_CACHE_DIR", os.path.join(self.cache_dir, "pages"))
+        self.page_cache_max_mb = int(os.getenv("PAGE_CACHE_MAX_MB", 512))
+        self.page_cache_ttl = int(os.getenv("PAGE_CACHE_TTL", 3600))
+        self.page_cache_max_age = int(os.getenv("PAGE_CACHE_MAX_AGE", 7 * 24 * 3600))
+        # SearXNG results are cached per normalized query for this many seconds.
+        self.search_cache_enabled = os.getenv("SEARCH_CACHE_ENABLED", "true").lower() == "true"
+        self.search_cache_ttl = int(os.getenv("SEARCH_CACHE_TTL", 6 * 3600))
+        # Exact-match LLM response cache (SQLite, LRU-capped, TTL in seconds).
+        self.llm_cache_enabled = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+        self.llm_cache_max_entries = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 5000))
+        self.llm_cache_ttl = int(os.getenv("LLM_CACHE_TTL", 24 * 3600))
+        # Semantic /search cache: answers are reused for queries whose
+        # embeddings have at least this cosine similarity.
+        self.semantic_cache_enabled = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+        self.semantic_cache_model = os.getenv("SEMANTIC_CACHE_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+        self.semantic_cache_threshold = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+        self.semantic_cache_max_entries = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 10000))
+        self.semantic_cache_ttl = int(os.getenv("SEMANTIC_CACHE_TTL", 7 * 24 * 3600))
+        # The cache is written to disk after this many new answers, or this
+        # many seconds after the first unsaved one, and at shutdown.
+        self.semantic_cache_save_every = int(os.getenv("SEMANTIC_CACHE_SAVE_EVERY", 50))
+        self.semantic_cache_save_interval = float(os.getenv("SEMANTIC_CACHE_SAVE_INTERVAL", 30))
+
+        # LLM connection pool shared by every completion call, and the
+        # per-request timeout in seconds.
+        self.llm_max_connections = int(os.getenv("LLM_MAX_CONNECTIONS", 32))
+        self.llm_timeout = float(os.getenv("LLM_TIMEOUT", 120))
+        # Bedrock runtime client shared by every /search request: pooled
+        # connections kept alive between calls, and the read timeout in seconds.
+        self.bedrock_max_connections = int(os.getenv("BEDROCK_MAX_CONNECTIONS", 32))
+        self.bedrock_read_timeout = float(os.getenv("BEDROCK_READ_TIMEOUT", 120))
+        # /search system prompt: "compact" is a short answer-only prompt, "full" the agent prompt
+        # sections, "full" sends the whole prompt. Bedrock marks it cacheable
+        # so repeated requests read it from Anthropic's prompt cache.
+        self.search_prompt_variant = os.getenv("SEARCH_PROMPT_VARIANT", "compact")
+        self.bedrock_prompt_cache = os.getenv("BEDROCK_PROMPT_CACHE", "true").lower() == "true"
+        # /search provider router: a duplicate request goes to the next provider
+        # once the first is slower than its ROUTER_HEDGE_PERCENTILE latency, or
+        # ROUTER_HEDGE_DELAY seconds until ROUTER_MIN_SAMPLES calls are recorded.
+        self.router_hedging = os.getenv("ROUTER_HEDGING", "true").lower() == "true"
+        self.router_hedge_percentile = float(os.getenv("ROUTER_HEDGE_PERCENTILE", "0.9"))
+        self.router_hedge_delay = float(os.getenv("ROUTER_HEDGE_DELAY", "4"))
+        self.router_min_samples = int(os.getenv("ROUTER_MIN_SAMPLES", 10))
+        self.router_max_error_rate = float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.5"))
+        self.router_workers = int(os.getenv("ROUTER_WORKERS", 32))
+        # Hedging pauses while this many losing calls are still running; they
+        # end on their own at the provider client's timeout.
+        self.router_max_abandoned = int(os.getenv("ROUTER_MAX_ABANDONED", 8))
+
+        # Initialize the OpenAI API client on a pooled, keep-alive connection
         if self.openai_api_key:
-            self.client = OpenAI(api_key=self.openai_api_key)
+            # Imported here so processes without a key (extraction workers) skip it
+            import httpx
+            from openai import OpenAI
+
+            self.client = OpenAI(
+                api_key=self.openai_api_key,
+                timeout=self.llm_timeout,
+                http_client=httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=self.llm_max_connections,
+                        max_keepalive_connections=self.llm_max_connections,
+                    ),
+                    timeout=self.llm_timeout,
+                ),
+            )
         else:
             self.client = None
 
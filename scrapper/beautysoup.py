@@ -1,7 +1,40 @@
 from bs4 import BeautifulSoup, XMLParsedAsHTMLWarning
+import re
 import warnings
 
-def extract_clean_text(html: str) -> str:
+from config import Config
+
+CFG = Config()
+
+# Tags whose content is never part of the page text.
+REMOVED_TAGS = ('script', 'style', 'nav', 'footer', 'meta', 'link', 'header', 'aside')
+
+_BODY_TAG = re.compile(r'<body[\s>/]', re.IGNORECASE)
+
+try:
+    from lxml import etree
+    import lxml.html
+except ImportError:  # pragma: no cover - lxml is needed by the bs4 backend too
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    HTMLParser = None
+
+
+def _looks_like_xml(html: str) -> bool:
+    # Try parsing as XML first if the input looks like it (you can modify this detection logic)
+    return html.strip().startswith("<?xml") or "<rss" in html.lower()
+
+
+def _clean_lines(text: str) -> str:
+    # Clean up excessive blank lines
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    return '\n'.join(lines)
+
+
+def extract_clean_text_bs4(html: str) -> str:
     """
     Extract and clean main text content from HTML or XML using BeautifulSoup.
     Tries to auto-detect document type and parse accordingly.
@@ -10,8 +43,7 @@ def extract_clean_text(html: str) -> str:
     warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
 
     try:
-        # Try parsing as XML first if the input looks like it (you can modify this detection logic)
-        if html.strip().startswith("<?xml") or "<rss" in html.lower():
+        if _looks_like_xml(html):
             soup = BeautifulSoup(html, 'lxml-xml')
         else:
             soup = BeautifulSoup(html, 'lxml')
@@ -20,13 +52,110 @@ def extract_clean_text(html: str) -> str:
         return ""
 
     # Remove unwanted tags
-    for tag in soup(['script', 'style', 'nav', 'footer', 'meta', 'link', 'header', 'aside']):
+    for tag in soup(list(REMOVED_TAGS)):
         tag.decompose()
 
     # Focus on main content
     main = soup.find(['main', 'article']) or soup.body
     text = main.get_text(separator='\n', strip=True) if main else soup.get_text(separator='\n', strip=True)
 
-    # Clean up excessive blank lines
-    lines = [line.strip() for line in text.splitlines() if line.strip()]
-    return '\n'.join(lines)
+    return _clean_lines(text)
+
+
+def extract_clean_text_lxml(html: str) -> str:
+    """
+    Extract the same text as the BeautifulSoup backend straight from an lxml
+    tree, without building a soup. XML documents go to BeautifulSoup.
+    """
+    if lxml is None or _looks_like_xml(html):
+        return extract_clean_text_bs4(html)
+    if not html.strip():
+        return ""
+    try:
+        root = lxml.html.document_fromstring(html)
+    except (etree.ParserError, ValueError):
+        return extract_clean_text_bs4(html)
+
+    # Focus on main content, ignoring any inside removed tags
+    main = None
+    for candidate in root.iter('main', 'article'):
+        if not any(ancestor.tag in REMOVED_TAGS for ancestor in candidate.iterancestors()):
+            main = candidate
+            break
+    if main is None:
+        main = root.find('body')
+    if main is None:
+        main = root
+
+    # Walk the tree collecting text nodes, skipping removed tags and comments
+    # but keeping the text that follows them, like decompose() does.
+    strings = []
+    walker = etree.iterwalk(main, events=('start', 'end', 'comment', 'pi'))
+    for event, element in walker:
+        if event in ('comment', 'pi'):
+            # Keep only the text that follows the comment
+            if element.tail:
+                strings.append(element.tail)
+        elif event == 'start':
+            # BeautifulSoup leaves <template> strings out of get_text()
+            if element.tag in REMOVED_TAGS or element.tag == 'template':
+                walker.skip_subtree()
+            elif element.text:
+                strings.append(element.text)
+        elif element is not main and element.tail:
+            strings.append(element.tail)
+
+    return _clean_lines('\n'.join(strings))
+
+
+def extract_clean_text_selectolax(html: str) -> str:
+    """
+    Extract main text content with selectolax (lexbor). Fastest backend;
+    XML documents go to BeautifulSoup.
+    """
+    # lexbor always creates a <body>, while lxml decides by its own rules
+    # whether there is one (and bs4 takes the whole document if not), so
+    # documents without a <body> tag go to the lxml backend.
+    if HTMLParser is None or _looks_like_xml(html) or not _BODY_TAG.search(html):
+        return extract_clean_text_lxml(html)
+    tree = HTMLParser(html)
+    tree.strip_tags(list(REMOVED_TAGS))
+
+    main = tree.css_first('main, article') or tree.body
+    text = main.text(separator='\n', strip=True) if main is not None else ""
+    return _clean_lines(text)
+
+
+EXTRACTION_BACKENDS = {
+    'bs4': extract_clean_text_bs4,
+    'lxml': extract_clean_text_lxml,
+    'selectolax': extract_clean_text_selectolax,
+}
+
+
+def get_extraction_backend(name=None):
+    """Return the extraction function for `name` ("auto" picks the fastest installed)."""
+    name = (name or CFG.extract_backend).lower()
+    if name == 'auto':
+        if HTMLParser is not None:
+            name = 'selectolax'
+        elif lxml is not None:
+            name = 'lxml'
+        else:
+            name = 'bs4'
+    return EXTRACTION_BACKENDS.get(name, extract_clean_text_bs4)
+
+
+def extract_clean_text(html: str, backend=None) -> str:
+    """
+    Extract and clean main text content from HTML or XML.
+    Uses the configured backend and falls back to BeautifulSoup if it fails.
+    """
+    extract = get_extraction_backend(backend)
+    if extract is extract_clean_text_bs4:
+        return extract(html)
+    try:
+        return extract(html)
+    except Exception as e:
+        print(f"Extraction backend failed ({e}), falling back to BeautifulSoup")
+        return extract_clean_text_bs4(html)
@@ -0,0 +1,251 @@
+"""Persistent process pool for CPU-bound HTML and PDF extraction."""
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.connection import Client
+
+from config import Config
+
+CFG = Config()
+
+# Sent by a worker as soon as it picks up a job
+_STARTED = "started"
+
+# Modules a worker imports before taking jobs. Workers start from the
+# scrapper.extract_worker bootstrap, so this is all they load: never the
+# web app or whatever else the parent's main module imports.
+WORKER_PRELOAD = ["scrapper.beautysoup", "scrapper.pyMupdf"]
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ExtractionTimeout(Exception):
+    """Raised when an extraction job runs past its timeout and its worker is killed."""
+
+
+def _worker_main(conn):
+    """Worker process loop: run (fn, args) jobs until told to stop."""
+    while True:
+        try:
+            data = conn.recv_bytes()
+        except EOFError:
+            return
+        try:
+            job = pickle.loads(data)
+        except Exception as e:  # e.g. fn lives in a module the worker cannot import
+            conn.send(_STARTED)
+            conn.send((False, e))
+            continue
+        if job is None:
+            return
+        fn, args = job
+        conn.send(_STARTED)
+        try:
+            result = (True, fn(*args))
+        except Exception as e:
+            result = (False, e)
+        try:
+            conn.send(result)
+        except Exception as e:  # the result or exception could not be pickled
+            conn.send((False, RuntimeError(f"Extraction result could not be sent: {e}")))
+
+
+def _worker_address():
+    name = f"extract-{os.getpid()}-{uuid.uuid4().hex[:12]}"
+    if sys.platform == "win32":
+        return rf"\\.\pipe\{name}"
+    return os.path.join(tempfile.gettempdir(), name)
+
+
+class _Worker:
+    """
+    One worker process and the connection its jobs go through. The worker
+    is a fresh interpreter running scrapper.extract_worker; it listens on a
+    private address and the pool connects to it with a one-off auth key.
+    """
+
+    def __init__(self, start_timeout):
+        address = _worker_address()
+        authkey = os.urandom(32)
+        env = dict(os.environ)
+        # The parent's import path, as multiprocessing's spawn would pass it
+        env["PYTHONPATH"] = os.pathsep.join([_ROOT] + [path for path in sys.path if path])
+        # Workers make no LLM calls; an empty key keeps Config from building a client
+        env["OPENAI_API_KEY"] = ""
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "scrapper.extract_worker", address],
+            stdin=subprocess.PIPE, env=env,
+        )
+        # The key goes over stdin so it does not show up in the process list
+        self.process.stdin.write(authkey.hex().encode() + b"\n")
+        self.process.stdin.close()
+        self.tasks = 0
+
+        deadline = time.monotonic() + start_timeout
+        while True:
+            try:
+                self.conn = Client(address, authkey=authkey)
+                return
+            except (FileNotFoundError, ConnectionRefusedError):
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.process.kill()
+                    self.process.wait()
+                    raise BrokenProcessPool("Extraction worker failed to start")
+                time.sleep(0.05)
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.conn.close()
+        try:
+            self.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+    def kill(self):
+        self.process.kill()
+        self.process.wait()
+        self.conn.close()
+
+
+class ExtractionPool:
+    """
+    Long-lived pool of worker processes for extraction jobs.
+
+    Each job runs on a worker of its own, and its timeout starts when that
+    worker picks it up, so time spent queued behind other jobs does not
+    count. A job that runs past its timeout has only its own worker killed;
+    the next job starts a replacement. Workers are recycled after
+    `max_tasks_per_child` jobs.
+    """
+
+    # Seconds a fresh worker may take to start and pick up its first job
+    start_timeout = 15
+
+    def __init__(self, max_workers=None, max_tasks_per_child=None, timeout=None):
+        self.max_workers = max_workers or CFG.extract_workers
+        self.max_tasks_per_child = max_tasks_per_child or CFG.extract_max_tasks_per_child
+        self.timeout = timeout or CFG.extract_timeout
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle = []
+        self._workers = 0
+        # Runs the jobs of run_many side by side
+        self._dispatcher = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="extract")
+        self.timeouts = 0
+
+    def _checkout(self):
+        """Take an idle worker, or start one if the pool is not full yet."""
+        with self._available:
+            self._available.wait_for(lambda: self._idle or self._workers < self.max_workers)
+            if self._idle:
+                return self._idle.pop()
+            self._workers += 1
+        try:
+            return _Worker(self.start_timeout)
+        except BaseException:
+            with self._available:
+                self._workers -= 1
+                self._available.notify()
+            raise
+
+    def _checkin(self, worker, healthy):
+        """Return a worker to the pool; a worker that failed or is worn out is stopped."""
+        reuse = healthy and worker.tasks < self.max_tasks_per_child
+        if not healthy:
+            worker.kill()
+        elif not reuse:
+            worker.close()
+        with self._available:
+            if reuse:
+                self._idle.append(worker)
+            else:
+                self._workers -= 1
+            self._available.notify()
+
+    def run(self, fn, *args, timeout=None):
+        """
+        Run `fn(*args)` in a worker process and return its result.
+
+        Raises:
+            ExtractionTimeout: If the job runs longer than `timeout` seconds.
+            BrokenProcessPool: If the worker process died during the job.
+        """
+        timeout = timeout or self.timeout
+        worker = self._checkout()
+        healthy = False
+        try:
+            worker.conn.send((fn, args))
+            if not worker.conn.poll(self.start_timeout):
+                raise ExtractionTimeout(f"Extraction worker did not start within {self.start_timeout}s")
+            worker.conn.recv()
+            # The job's clock starts now that a worker has picked it up
+            if not worker.conn.poll(timeout):
+                with self._lock:
+                    self.timeouts += 1
+                raise ExtractionTimeout(f"Extraction took longer than {timeout}s")
+            ok, value = worker.conn.recv()
+            worker.tasks += 1
+            healthy = True
+        except (EOFError, OSError):
+            raise BrokenProcessPool("Extraction worker exited unexpectedly")
+        finally:
+            self._checkin(worker, healthy)
+        if not ok:
+            raise value
+        return value
+
+    def run_many(self, fn, args_list, timeout=None):
+        """
+        Run `fn(*args)` for every tuple in `args_list` in parallel and return
+        the results in order. `timeout` applies to each job separately.
+
+        Raises:
+            ExtractionTimeout: If any job runs longer than `timeout` seconds.
+        """
+        futures = [self._dispatcher.submit(self.run, fn, *args, timeout=timeout) for args in args_list]
+        return [future.result() for future in futures]
+
+    def shutdown(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.close()
+        self._dispatcher.shutdown(wait=False, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_extraction_pool():
+    """Return the process-wide extraction pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ExtractionPool()
+    return _pool
+
+
+def run_extraction_many(fn, args_list, timeout=None):
+    """Run a batch of extraction jobs in parallel, or inline if the pool is disabled."""
+    if not CFG.extract_pool_enabled:
+        return [fn(*args) for args in args_list]
+    return get_extraction_pool().run_many(fn, args_list, timeout=timeout)
+
+
+def run_extraction(fn, *args, timeout=None):
+    """Run an extraction job in the process pool, or inline if the pool is disabled."""
+    if not CFG.extract_pool_enabled:
+        return fn(*args)
+    return get_extraction_pool().run(fn, *args, timeout=timeout)
@@ -0,0 +1,29 @@
+"""
+Bootstrap of an extraction worker process (see scrapper/extract_pool.py).
+
+Run as `python -m scrapper.extract_worker ADDRESS` with the hex auth key on
+stdin. Starting from this module rather than through multiprocessing keeps
+the parent's main module, usually the web app, out of the worker.
+"""
+import importlib
+import sys
+from multiprocessing.connection import Listener
+
+from scrapper.extract_pool import WORKER_PRELOAD, _worker_main
+
+
+def main():
+    address = sys.argv[1]
+    authkey = bytes.fromhex(sys.stdin.readline().strip())
+    for module in WORKER_PRELOAD:
+        importlib.import_module(module)
+    with Listener(address, authkey=authkey) as listener:
+        conn = listener.accept()
+    try:
+        _worker_main(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
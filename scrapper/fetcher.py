@@ -0,0 +1,209 @@
+"""Concurrent page-fetch engine with per-host politeness limits."""
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlparse, urlsplit, urlunsplit
+
+from config import Config
+
+CFG = Config()
+
+
+def get_host(url):
+    """Return the lower-cased host of a URL, or an empty string."""
+    try:
+        return urlparse(url or "").netloc.lower()
+    except ValueError:
+        return ""
+
+
+# Query parameters that only identify the referrer / campaign.
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+    "ref", "ref_src", "_ga", "_hsenc", "_hsmi", "spm",
+}
+
+
+def canonicalize_url(url):
+    """
+    Return a canonical form of `url` for de-duplication: lower-cased scheme
+    and host, no default port, no fragment, no tracking parameters and no
+    trailing slash.
+    """
+    try:
+        parts = urlsplit((url or "").strip())
+    except ValueError:
+        return url
+    if not parts.netloc:
+        return url
+    scheme = parts.scheme.lower()
+    host = parts.netloc.lower()
+    if (scheme, host.rsplit(":", 1)[-1]) in (("http", "80"), ("https", "443")):
+        host = host.rsplit(":", 1)[0]
+    query = urlencode([
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    ])
+    path = parts.path.rstrip("/")
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one execution; the
+    other callers wait for and share its result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        # Calls answered by another caller's execution
+        self.shared = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = Future()
+                self._calls[key] = call
+            else:
+                self.shared += 1
+        if not leader:
+            return call.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+class FetchEngine:
+    """
+    Bounded worker pool that runs fetch jobs concurrently.
+
+    The number of jobs in flight is capped globally by the pool size and
+    per host by `per_host_limit`. Requests to the same host also start at
+    least `host_delay` seconds apart, replacing the old global sleep.
+
+    Jobs wait in a queue of their host until the host has a free slot and
+    its turn has come, and only then go to the pool, so a worker thread
+    never sits idle waiting on one host while other hosts have work.
+    """
+
+    def __init__(self, max_workers=None, per_host_limit=None, host_delay=None):
+        self.max_workers = max_workers or CFG.fetch_max_workers
+        self.per_host_limit = per_host_limit or CFG.fetch_per_host_limit
+        self.host_delay = CFG.fetch_host_delay if host_delay is None else host_delay
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="fetch"
+        )
+        self._lock = threading.Lock()
+        # host -> jobs not yet handed to the pool
+        self._pending = {}
+        # host -> jobs handed to the pool and not yet finished
+        self._active = {}
+        # host -> earliest time its next job may start; None while a
+        # dispatched job has not started yet, since the delay counts from
+        # that job's start
+        self._host_next_start = {}
+        # Hosts with a timer pending to dispatch once their turn comes
+        self._timers = set()
+
+    def _dispatch(self, host):
+        """Hand `host`'s queued jobs to the pool while it has a free slot and its turn has come."""
+        with self._lock:
+            queue = self._pending.get(host)
+            while queue and self._active.get(host, 0) < self.per_host_limit:
+                if queue[0][0].cancelled():
+                    queue.popleft()
+                    continue
+                if host and self.host_delay:
+                    next_start = self._host_next_start.get(host, 0.0)
+                    if next_start is None:
+                        break
+                    wait = next_start - time.monotonic()
+                    if wait > 0:
+                        if host not in self._timers:
+                            self._timers.add(host)
+                            timer = threading.Timer(wait, self._turn_came, args=(host,))
+                            timer.daemon = True
+                            timer.start()
+                        break
+                    self._host_next_start[host] = None
+                self._active[host] = self._active.get(host, 0) + 1
+                self._executor.submit(self._run, host, *queue.popleft())
+            if not queue:
+                self._pending.pop(host, None)
+
+    def _turn_came(self, host):
+        with self._lock:
+            self._timers.discard(host)
+        self._dispatch(host)
+
+    def _run(self, host, future, fn, item):
+        started = future.set_running_or_notify_cancel()
+        if host and self.host_delay:
+            with self._lock:
+                self._host_next_start[host] = time.monotonic() + (self.host_delay if started else 0.0)
+            self._dispatch(host)
+        try:
+            if started:
+                try:
+                    result = fn(item)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+        finally:
+            with self._lock:
+                self._active[host] -= 1
+                if not self._active[host]:
+                    del self._active[host]
+            self._dispatch(host)
+
+    def submit(self, url, fn, item):
+        """Schedule `fn(item)` as a fetch against `url`. Returns a Future."""
+        host = get_host(url)
+        future = Future()
+        with self._lock:
+            self._pending.setdefault(host, deque()).append((future, fn, item))
+        self._dispatch(host)
+        return future
+
+    def map(self, fn, items, url_of):
+        """
+        Run `fn` over `items` concurrently and return the results in the
+        same order as `items`.
+
+        Args:
+            fn (callable): The job to run for each item.
+            items (list): The items to process.
+            url_of (callable): Returns the URL an item will fetch, used for
+                the per-host limits.
+        """
+        futures = [self.submit(url_of(item), fn, item) for item in items]
+        return [future.result() for future in futures]
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_fetch_engine():
+    """Return the process-wide fetch engine, creating it on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = FetchEngine()
+    return _engine
@@ -0,0 +1,394 @@
+"""Persistent on-disk page cache with conditional revalidation."""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from requests.utils import get_encoding_from_headers
+
+from actions.http_client import http_get
+from config import Config
+
+CFG = Config()
+
+
+class PageTooLarge(Exception):
+    """Raised when a response body is larger than the caller allows."""
+
+
+class UnsupportedContentType(Exception):
+    """Raised when a response's Content-Type is not one the caller accepts."""
+
+    def __init__(self, url, content_type):
+        super().__init__(f"{url} has unsupported content type {content_type!r}")
+        self.content_type = content_type
+
+
+class FetchedPage:
+    """
+    A downloaded (or cached) response body and the headers we keep for it.
+
+    `bytes_read` is the decoded body size pulled from the network for this
+    fetch and `wire_bytes` the compressed size on the wire; both are 0 when
+    the page came from the cache. `truncated` is set when the body was cut
+    at the caller's byte cap.
+    """
+
+    def __init__(self, url, body, content_type="", encoding=None, etag=None,
+                 last_modified=None, from_cache=False):
+        self.url = url
+        self.body = body
+        self.content_type = content_type or ""
+        self.encoding = encoding
+        self.etag = etag
+        self.last_modified = last_modified
+        self.from_cache = from_cache
+        self.bytes_read = 0
+        self.wire_bytes = 0
+        self.truncated = False
+
+    @property
+    def text(self):
+        """The body decoded with the charset the server announced, or UTF-8."""
+        return self.body.decode(self.encoding or "utf-8", errors="replace")
+
+
+class PageCache:
+    """
+    Size-bounded page cache. Bodies are stored as files, metadata in SQLite.
+
+    Entries younger than `ttl` seconds are served without touching the
+    network. Older entries are revalidated with a conditional GET using the
+    stored ETag / Last-Modified. Entries unused for `max_age` seconds are
+    dropped by a sweep that runs at most every `sweep_interval` seconds, and
+    the least recently used ones go first once the bodies exceed `max_bytes`.
+    Bodies cut at a caller's byte cap are flagged as truncated and only
+    served to callers that accept the same cut.
+    """
+
+    sweep_interval = 600
+
+    def __init__(self, directory=None, max_bytes=None, ttl=None, max_age=None):
+        self.directory = directory or CFG.page_cache_dir
+        self.max_bytes = CFG.page_cache_max_mb * 1024 * 1024 if max_bytes is None else max_bytes
+        self.ttl = CFG.page_cache_ttl if ttl is None else ttl
+        self.max_age = CFG.page_cache_max_age if max_age is None else max_age
+        self.body_dir = os.path.join(self.directory, "bodies")
+        os.makedirs(self.body_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            os.path.join(self.directory, "index.sqlite"), check_same_thread=False
+        )
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                url TEXT,
+                content_type TEXT,
+                encoding TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                size INTEGER,
+                stored_at REAL,
+                accessed_at REAL,
+                truncated INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(pages)")]
+        if "truncated" not in columns:
+            self._db.execute("ALTER TABLE pages ADD COLUMN truncated INTEGER NOT NULL DEFAULT 0")
+        self._db.execute("CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at)")
+        self._db.commit()
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        self._next_sweep = 0.0
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.evictions = 0
+        # Network traffic of the misses: decoded body bytes, compressed
+        # bytes on the wire, and bodies cut at a caller's byte cap
+        self.bytes_read = 0
+        self.wire_bytes = 0
+        self.truncated = 0
+
+    @staticmethod
+    def _key(url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _body_path(self, key):
+        return os.path.join(self.body_dir, key)
+
+    def lookup(self, url):
+        """Return (page, is_fresh) for a cached URL, or (None, False)."""
+        key = self._key(url)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT content_type, encoding, etag, last_modified, stored_at, truncated "
+                "FROM pages WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None, False
+        try:
+            with open(self._body_path(key), "rb") as f:
+                body = f.read()
+        except OSError:
+            self.delete(url)
+            return None, False
+        content_type, encoding, etag, last_modified, stored_at, truncated = row
+        page = FetchedPage(url, body, content_type, encoding, etag, last_modified, from_cache=True)
+        page.truncated = bool(truncated)
+        return page, time.time() - stored_at < self.ttl
+
+    def store(self, page):
+        """Write a page body and its validators to the cache."""
+        key = self._key(page.url)
+        path = self._body_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(page.body)
+        os.replace(tmp_path, path)
+        now = time.time()
+        with self._lock:
+            old = self._db.execute("SELECT size FROM pages WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, page.url, page.content_type, page.encoding, page.etag,
+                 page.last_modified, len(page.body), now, now, int(page.truncated)),
+            )
+            self._db.commit()
+            self._total_bytes += len(page.body) - (old[0] if old else 0)
+            due = self._total_bytes > self.max_bytes or now >= self._next_sweep
+        if due:
+            self.evict()
+
+    def mark_used(self, url, revalidated=False, etag=None, last_modified=None):
+        """
+        Record a cache hit. A revalidated entry also restarts its TTL and
+        takes any new validators the 304 response carried.
+        """
+        now = time.time()
+        with self._lock:
+            if revalidated:
+                self.revalidated += 1
+                self._db.execute(
+                    "UPDATE pages SET stored_at = ?, accessed_at = ?, "
+                    "etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) "
+                    "WHERE key = ?",
+                    (now, now, etag, last_modified, self._key(url)),
+                )
+            else:
+                self.hits += 1
+                self._db.execute(
+                    "UPDATE pages SET accessed_at = ? WHERE key = ?", (now, self._key(url))
+                )
+            self._db.commit()
+
+    def record_miss(self, page):
+        """Count a fetch that went to the network, and the bytes `page` pulled."""
+        with self._lock:
+            self.misses += 1
+            self.bytes_read += page.bytes_read
+            self.wire_bytes += page.wire_bytes
+            self.truncated += page.truncated
+
+    def delete(self, url):
+        key = self._key(url)
+        with self._lock:
+            old = self._db.execute("SELECT size FROM pages WHERE key = ?", (key,)).fetchone()
+            self._db.execute("DELETE FROM pages WHERE key = ?", (key,))
+            self._db.commit()
+            if old:
+                self._total_bytes -= old[0]
+        try:
+            os.remove(self._body_path(key))
+        except OSError:
+            pass
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under the size cap."""
+        with self._lock:
+            now = time.time()
+            self._next_sweep = now + self.sweep_interval
+            doomed = self._db.execute(
+                "SELECT key, size FROM pages WHERE accessed_at < ?", (now - self.max_age,)
+            ).fetchall()
+            total = self._total_bytes - sum(size for _, size in doomed)
+            if total > self.max_bytes:
+                expired = {key for key, _ in doomed}
+                # accessed_at is indexed, so this walks entries oldest first
+                for key, size in self._db.execute(
+                    "SELECT key, size FROM pages ORDER BY accessed_at ASC"
+                ):
+                    if total <= self.max_bytes:
+                        break
+                    if key not in expired:
+                        doomed.append((key, size))
+                        total -= size
+            doomed = [key for key, _ in doomed]
+            self._db.executemany("DELETE FROM pages WHERE key = ?", [(key,) for key in doomed])
+            self._db.commit()
+            self._total_bytes = total
+            self.evictions += len(doomed)
+        for key in doomed:
+            try:
+                os.remove(self._body_path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        """Return hit/miss counters, network bytes read and the current size of the cache."""
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages"
+            ).fetchone()
+            lookups = self.hits + self.revalidated + self.misses
+            return {
+                "hits": self.hits,
+                "revalidated": self.revalidated,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.revalidated) / lookups if lookups else 0.0,
+                "bytes_read": self.bytes_read,
+                "wire_bytes": self.wire_bytes,
+                "truncated": self.truncated,
+                "entries": entries,
+                "size_bytes": size,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_page_cache():
+    """Return the process-wide page cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PageCache()
+    return _cache
+
+
+def _check_content_type(url, content_type, allowed_types):
+    if allowed_types is None or not content_type:
+        return
+    content_type = content_type.lower()
+    if not any(allowed in content_type for allowed in allowed_types):
+        raise UnsupportedContentType(url, content_type)
+
+
+def _covers(page, max_bytes, truncate):
+    """Whether a cached body is complete enough for this caller."""
+    if not page.truncated:
+        return True
+    # A body cut at an earlier cap only serves callers that accept the same cut
+    return truncate and max_bytes is not None and max_bytes <= len(page.body)
+
+
+def _cap_cached(page, max_bytes, truncate):
+    """Apply the caller's byte cap to a page served from the cache."""
+    if max_bytes is None or len(page.body) <= max_bytes:
+        return page
+    if not truncate:
+        raise PageTooLarge(f"{page.url} is larger than {max_bytes} bytes")
+    page.body = page.body[:max_bytes]
+    page.truncated = True
+    return page
+
+
+def cached_get(url, timeout=5, headers=None, max_bytes=None, truncate=False,
+               allowed_types=None):
+    """
+    Fetch `url` through the page cache, streaming the body.
+
+    Args:
+        url (str): The URL to fetch.
+        timeout (float): Connect/read timeout for the network request.
+        headers (dict): Extra request headers.
+        max_bytes (int): Upper bound on the body size.
+        truncate (bool): Stop reading at `max_bytes` and keep the partial
+            body instead of raising PageTooLarge.
+        allowed_types (tuple): Content-Type substrings to accept. Checked
+            before the body is read; responses without a Content-Type pass.
+
+    Returns:
+        FetchedPage: The page body and metadata.
+
+    Raises:
+        requests.exceptions.RequestException: On network or HTTP errors.
+        PageTooLarge: If the body exceeds `max_bytes` and `truncate` is False.
+        UnsupportedContentType: If the Content-Type is not in `allowed_types`.
+    """
+    cache = get_page_cache() if CFG.page_cache_enabled else None
+    cached, fresh = cache.lookup(url) if cache else (None, False)
+    if cached is not None and not _covers(cached, max_bytes, truncate):
+        cached, fresh = None, False
+    if cached is not None and fresh:
+        _check_content_type(url, cached.content_type, allowed_types)
+        cache.mark_used(url)
+        return _cap_cached(cached, max_bytes, truncate)
+
+    request_headers = dict(headers or {})
+    if cached is not None:
+        if cached.etag:
+            request_headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            request_headers["If-Modified-Since"] = cached.last_modified
+
+    response = http_get(url, headers=request_headers, stream=True, timeout=timeout)
+    with response:
+        if response.status_code == 304 and cached is not None:
+            _check_content_type(url, cached.content_type, allowed_types)
+            cache.mark_used(
+                url,
+                revalidated=True,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
+            return _cap_cached(cached, max_bytes, truncate)
+        response.raise_for_status()
+
+        content_type = response.headers.get("Content-Type", "")
+        _check_content_type(url, content_type, allowed_types)
+        content_length = response.headers.get("Content-Length", "")
+        if (max_bytes is not None and not truncate and content_length.isdigit()
+                and int(content_length) > max_bytes):
+            raise PageTooLarge(f"{url} is larger than {max_bytes} bytes")
+
+        chunks = []
+        total = 0
+        truncated = False
+        for chunk in response.iter_content(chunk_size=8192):
+            if max_bytes is not None and total + len(chunk) > max_bytes:
+                if not truncate:
+                    raise PageTooLarge(f"{url} is larger than {max_bytes} bytes")
+                chunks.append(chunk[:max_bytes - total])
+                total = max_bytes
+                truncated = True
+                break
+            total += len(chunk)
+            chunks.append(chunk)
+        try:
+            wire_bytes = response.raw.tell()
+        except (AttributeError, OSError):
+            wire_bytes = total
+
+    page = FetchedPage(
+        url,
+        b"".join(chunks),
+        content_type=content_type,
+        encoding=get_encoding_from_headers(response.headers)
+        if "charset" in content_type.lower() else None,
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+    )
+    page.bytes_read = total
+    page.wire_bytes = wire_bytes
+    page.truncated = truncated
+    if cache is not None:
+        cache.record_miss(page)
+        if "no-store" not in response.headers.get("Cache-Control", "").lower():
+            cache.store(page)
+    return page
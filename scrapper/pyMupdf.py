@@ -5,10 +5,19 @@ import time
 import hashlib
 import threading
 import signal
+import tempfile
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
 from io import BytesIO
 
+from config import Config
+from scrapper.extract_pool import run_extraction, run_extraction_many, ExtractionTimeout
+from scrapper.page_cache import cached_get, PageTooLarge, UnsupportedContentType
+
+CFG = Config()
+
+# Only the first MAX_PDF_PAGES pages of a document are extracted
+MAX_PDF_PAGES = 50
+
 # Create a dedicated folder for PDF storage
 PDF_STORAGE_DIR = "pdf_storage"
 os.makedirs(PDF_STORAGE_DIR, exist_ok=True)
@@ -33,49 +42,36 @@ def process_pdf_url(url, keep_file=False):
     
     try:
         # Use a short timeout for the initial connection
+        # The User-Agent comes from the shared session
         headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
             'Accept': 'application/pdf,*/*'
         }
         
-        # Set a tight timeout to prevent hanging
-        response = requests.get(url, headers=headers, stream=True, timeout=5)
-        response.raise_for_status()
-        
-        # Check if it's actually a PDF
-        content_type = response.headers.get('Content-Type', '').lower()
-        if 'application/pdf' not in content_type and not url.lower().endswith('.pdf'):
-            return f"[Not a PDF: {content_type}]"
-        
-        # Read the PDF into memory with size limit (10MB)
+        # Read the PDF into memory with size limit (10MB); repeated URLs are
+        # served from the page cache
         max_size = 10 * 1024 * 1024  # 10MB
-        pdf_data = BytesIO()
-        total_size = 0
-        
-        for chunk in response.iter_content(chunk_size=8192):
-            total_size += len(chunk)
-            if total_size > max_size:
-                return "[PDF too large - extraction skipped]"
-            pdf_data.write(chunk)
+        # Check if it's actually a PDF before the body is downloaded
+        allowed_types = None if url.lower().endswith('.pdf') else ('application/pdf',)
+        try:
+            page = cached_get(url, timeout=5, headers=headers, max_bytes=max_size,
+                              allowed_types=allowed_types)
+        except PageTooLarge:
+            return "[PDF too large - extraction skipped]"
+        except UnsupportedContentType as e:
+            return f"[Not a PDF: {e.content_type}]"
         
-        pdf_data.seek(0)
+        # Extract page ranges in parallel in the worker process pool; a job
+        # that runs past the timeout has its worker killed
+        try:
+            result = extract_pdf_parallel(page.body, timeout=15)
+        except ExtractionTimeout:
+            return "[PDF processing timeout - extraction aborted]"
         
-        # Use a ThreadPoolExecutor with timeout to prevent hanging during extraction
-        with ThreadPoolExecutor(max_workers=1) as executor:
-            # Submit the extraction task
-            future = executor.submit(extract_pdf_from_memory, pdf_data)
+        # Truncate text if it's too long
+        if len(result) > 50000:
+            return result[:50000] + "... [text truncated due to length]"
             
-            try:
-                # Wait for a maximum of 15 seconds
-                result = future.result(timeout=15)
-                
-                # Truncate text if it's too long
-                if len(result) > 50000:
-                    return result[:50000] + "... [text truncated due to length]"
-                    
-                return result
-            except TimeoutError:
-                return "[PDF processing timeout - extraction aborted]"
+        return result
             
     except requests.exceptions.Timeout:
         return "[Connection timeout while downloading PDF]"
@@ -84,6 +80,66 @@ def process_pdf_url(url, keep_file=False):
     except Exception as e:
         return f"[PDF processing error: {str(e)}]"
 
+def extract_pdf_pages(pdf_path, start, stop):
+    """
+    Extract the text of pages [start, stop) of a PDF file.
+    Runs inside an extraction worker process.
+
+    Returns:
+        tuple: (page_count, text)
+    """
+    doc = fitz.open(pdf_path, filetype="pdf")
+    try:
+        stop = min(stop, doc.page_count)
+        return doc.page_count, "".join(doc[i].get_text() for i in range(start, stop))
+    finally:
+        doc.close()
+
+
+def extract_pdf_parallel(pdf_data, timeout=15):
+    """
+    Extract text from a PDF in memory using the extraction process pool.
+
+    The PDF is written to a temporary file once and each job opens it by
+    path, so the bytes are not copied to every worker. The first job reads
+    the page count along with the first page range; the remaining ranges
+    (up to MAX_PDF_PAGES) are then extracted in parallel. `timeout` bounds
+    each job, and a job running past it has only its own worker killed.
+
+    Raises:
+        ExtractionTimeout: If a job does not finish within `timeout`.
+    """
+    pages_per_job = CFG.pdf_pages_per_job
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(pdf_data)
+        pdf_path = f.name
+    try:
+        page_count, first_text = run_extraction(
+            extract_pdf_pages, pdf_path, 0, pages_per_job, timeout=timeout
+        )
+        max_pages = min(MAX_PDF_PAGES, page_count)
+        ranges = [
+            (pdf_path, start, min(start + pages_per_job, max_pages))
+            for start in range(pages_per_job, max_pages, pages_per_job)
+        ]
+        parts = [first_text]
+        if ranges:
+            parts.extend(text for _, text in run_extraction_many(
+                extract_pdf_pages, ranges, timeout=timeout
+            ))
+    except ExtractionTimeout:
+        raise
+    except Exception as e:
+        return f"[PDF extraction error: {str(e)}]"
+    finally:
+        os.remove(pdf_path)
+
+    # Add a note if we're limiting pages
+    if max_pages < page_count:
+        parts.append(f"\n\n[Note: Only showing first {max_pages} of {page_count} pages]")
+    return "".join(parts)
+
+
 def extract_pdf_from_memory(pdf_data):
     """Extract text from a PDF file in memory."""
     try:
@@ -91,19 +147,15 @@ def extract_pdf_from_memory(pdf_data):
         doc = fitz.open(stream=pdf_data, filetype="pdf")
         
         # Extract text with a reasonable limit
-        text = ""
-        max_pages = min(50, doc.page_count)  # Limit to 50 pages
+        max_pages = min(MAX_PDF_PAGES, doc.page_count)  # Limit to 50 pages
+        parts = [doc[i].get_text() for i in range(max_pages)]
         
-        for i in range(max_pages):
-            page = doc[i]
-            text += page.get_text()
-            
-            # Add a note if we're limiting pages
-            if i+1 == max_pages and max_pages < doc.page_count:
-                text += f"\n\n[Note: Only showing first {max_pages} of {doc.page_count} pages]"
+        # Add a note if we're limiting pages
+        if max_pages < doc.page_count:
+            parts.append(f"\n\n[Note: Only showing first {max_pages} of {doc.page_count} pages]")
                 
         doc.close()
-        return text
+        return "".join(parts)
     except Exception as e:
         return f"[PDF extraction error: {str(e)}]"
 
@@ -0,0 +1,59 @@
+"""
+Times each text-extraction backend over the saved HTML corpus.
+
+    python tests/bench_extraction.py [--repeat 50] [--scale 20]
+
+`--scale` repeats each page's body that many times to approximate large pages.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scrapper.beautysoup import EXTRACTION_BACKENDS
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), "corpus")
+
+
+def load_corpus(scale):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        if scale > 1 and "<body" in html:
+            head, body = html.split("<body", 1)
+            body = body.split(">", 1)[1].rsplit("</body>", 1)[0]
+            html = f"{head}<body>{body * scale}</body></html>"
+        pages.append((os.path.basename(path), html))
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--scale", type=int, default=1)
+    args = parser.parse_args()
+
+    pages = load_corpus(args.scale)
+    total_kb = sum(len(html.encode("utf-8")) for _, html in pages) / 1024
+    print(f"{len(pages)} pages, {total_kb:.0f} KB, {args.repeat} rounds")
+
+    baseline = None
+    for name, extract in EXTRACTION_BACKENDS.items():
+        for _, html in pages:
+            extract(html)  # warm up imports and parser caches
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            for _, html in pages:
+                extract(html)
+        elapsed = time.perf_counter() - started
+        per_page = elapsed / (args.repeat * len(pages)) * 1000
+        baseline = baseline or elapsed
+        print(f"{name:>10}: {per_page:7.3f} ms/page  {baseline / elapsed:5.1f}x vs bs4")
+
+
+if __name__ == "__main__":
+    main()
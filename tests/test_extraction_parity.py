@@ -0,0 +1,42 @@
+"""The lxml and selectolax extractors must return exactly what the bs4 one does."""
+import glob
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scrapper.beautysoup import EXTRACTION_BACKENDS, extract_clean_text_bs4
+
+CORPUS = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "corpus", "*.html")))
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_corpus_is_present():
+    assert CORPUS
+
+
+@pytest.mark.parametrize("backend", sorted(set(EXTRACTION_BACKENDS) - {"bs4"}))
+@pytest.mark.parametrize("path", CORPUS, ids=os.path.basename)
+def test_backend_matches_bs4(backend, path):
+    html = _read(path)
+    assert EXTRACTION_BACKENDS[backend](html) == extract_clean_text_bs4(html)
+
+
+@pytest.mark.parametrize("backend", sorted(EXTRACTION_BACKENDS))
+@pytest.mark.parametrize("name", ["spa_shell.html", "empty_main.html"])
+def test_empty_pages_give_no_text(backend, name):
+    # Text from <title> or outside an empty <main> must not pass as page content
+    html = _read(os.path.join(os.path.dirname(__file__), "corpus", name))
+    assert EXTRACTION_BACKENDS[backend](html) == ""
+
+
+@pytest.mark.parametrize("backend", sorted(EXTRACTION_BACKENDS))
+@pytest.mark.parametrize("html", ["", "   ", "<p>only a paragraph</p>", "plain text, no tags"])
+def test_edge_cases_match_bs4(backend, html):
+    assert EXTRACTION_BACKENDS[backend](html) == extract_clean_text_bs4(html)
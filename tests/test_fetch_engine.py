@@ -0,0 +1,85 @@
+"""Per-host limits in FetchEngine must not hold up other hosts."""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scrapper.fetcher import FetchEngine
+
+
+def _timed_job(starts, duration=0.05):
+    def job(item):
+        starts.append((item, time.monotonic()))
+        time.sleep(duration)
+        return item
+    return job
+
+
+def test_busy_host_does_not_starve_other_hosts():
+    engine = FetchEngine(max_workers=2, per_host_limit=1, host_delay=0.3)
+    starts = []
+    job = _timed_job(starts)
+    begin = time.monotonic()
+    slow = [engine.submit(f"https://a.example/{i}", job, f"a{i}") for i in range(4)]
+    other = engine.submit("https://b.example/", job, "b")
+    assert other.result(5) == "b"
+    assert time.monotonic() - begin < 0.25
+    assert [future.result(5) for future in slow] == ["a0", "a1", "a2", "a3"]
+
+
+def test_same_host_starts_are_spaced_by_host_delay():
+    engine = FetchEngine(max_workers=4, per_host_limit=2, host_delay=0.1)
+    starts = []
+    results = engine.map(_timed_job(starts, 0.0), list(range(4)), lambda item: "https://a.example/")
+    assert results == [0, 1, 2, 3]
+    times = sorted(start for _, start in starts)
+    assert all(later - earlier >= 0.09 for earlier, later in zip(times, times[1:]))
+
+
+def test_per_host_limit_caps_jobs_in_flight():
+    engine = FetchEngine(max_workers=8, per_host_limit=2, host_delay=0)
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def job(item):
+        with lock:
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return item
+
+    assert engine.map(job, list(range(8)), lambda item: "https://a.example/") == list(range(8))
+    assert running[1] == 2
+
+
+def test_job_errors_reach_the_future_and_free_the_slot():
+    engine = FetchEngine(max_workers=2, per_host_limit=1, host_delay=0)
+
+    def job(item):
+        if item == "bad":
+            raise ValueError(item)
+        return item
+
+    failed = engine.submit("https://a.example/", job, "bad")
+    ok = engine.submit("https://a.example/", job, "ok")
+    with pytest.raises(ValueError):
+        failed.result(5)
+    assert ok.result(5) == "ok"
+
+
+def test_cancelled_job_does_not_run():
+    engine = FetchEngine(max_workers=1, per_host_limit=1, host_delay=0.2)
+    ran = []
+    first = engine.submit("https://a.example/", ran.append, 1)
+    second = engine.submit("https://a.example/", ran.append, 2)
+    assert second.cancel()
+    third = engine.submit("https://a.example/", ran.append, 3)
+    first.result(5)
+    third.result(5)
+    assert ran == [1, 3]
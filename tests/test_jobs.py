@@ -0,0 +1,58 @@
+"""Job deduplication must only merge questions that ask the same thing."""
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from webui import jobs
+
+
+class BlockingResearch:
+    """Stands in for Research and keeps every job running until released."""
+
+    release = threading.Event()
+
+    def __init__(self, question, agent, system_prompt, stream_output=None):
+        self.question = question
+
+    def search_online(self):
+        self.release.wait(5)
+
+    def write_report_stream(self, report_type, extra_prompt):
+        yield f"Report on {self.question}"
+
+    def write_report(self, report_type, extra_prompt):
+        return f"Report on {self.question}"
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "Research", BlockingResearch)
+    BlockingResearch.release.clear()
+    manager = jobs.JobManager(path=str(tmp_path / "jobs.sqlite"), workers=2)
+    yield manager
+    BlockingResearch.release.set()
+    # Let the jobs finish before Research is restored
+    manager._executor.shutdown(wait=True)
+
+
+@pytest.mark.parametrize("first, second", [
+    ("What is 2+2?", "what is 2-2"),
+    ("C++ tutorial", "C tutorial"),
+    ("C# vs Java", "C vs Java"),
+])
+def test_questions_differing_by_symbols_are_separate_jobs(manager, first, second):
+    job, _ = manager.submit(first)
+    other, deduplicated = manager.submit(second)
+    assert not deduplicated
+    assert other["id"] != job["id"]
+
+
+def test_same_question_is_deduplicated(manager):
+    job, _ = manager.submit("What is 2+2?")
+    again, deduplicated = manager.submit("  what is 2+2 ")
+    assert deduplicated
+    assert again["id"] == job["id"]
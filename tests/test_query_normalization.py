@@ -0,0 +1,32 @@
+"""normalize_query may only fold differences that cannot change a query's meaning."""
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from actions.searxng_search import normalize_query
+
+
+@pytest.mark.parametrize("first, second", [
+    ("What is 2+2?", "what is 2-2"),
+    ("C++ tutorial", "C tutorial"),
+    ("C# vs Java", "C vs Java"),
+    ("<div> vs <span>", "div vs span"),
+    ("node.js", "node js"),
+    ("user@example.com", "user example com"),
+    ("TCP/IP", "TCP IP"),
+])
+def test_symbols_inside_words_are_kept(first, second):
+    assert normalize_query(first) != normalize_query(second)
+
+
+@pytest.mark.parametrize("first, second", [
+    ("What is 2+2?", "what is 2+2"),
+    ("C++ tutorial!!", "  c++   tutorial "),
+    ('"Node.js" streams.', "node.js streams"),
+    ("apples,, oranges; pears", "apples oranges pears"),
+])
+def test_meaningless_differences_are_folded(first, second):
+    assert normalize_query(first) == normalize_query(second)
@@ -0,0 +1,56 @@
+"""Concurrent /search calls may only share a flight when they ask the same question."""
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from actions.searxng_search import query_key
+from scrapper.fetcher import SingleFlight
+
+
+def _run_concurrently(queries):
+    """Run one flight per query at the same time; return the queries that executed."""
+    flight = SingleFlight()
+    started = threading.Barrier(len(queries))
+    release = threading.Event()
+    executed = []
+
+    def upstream(query):
+        executed.append(query)
+        release.wait(5)
+        return query
+
+    def caller(query):
+        started.wait(5)
+        flight.do(query_key(query), upstream, query)
+
+    threads = [threading.Thread(target=caller, args=(query,)) for query in queries]
+    for thread in threads:
+        thread.start()
+    # Give every caller time to join a flight before the leaders return
+    threading.Event().wait(0.2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return executed, flight.shared
+
+
+@pytest.mark.parametrize("first, second", [
+    ("What is 2+2?", "what is 2-2"),
+    ("C++ tutorial", "C tutorial"),
+    ("C# vs Java", "C vs Java"),
+])
+def test_different_questions_do_not_share_a_flight(first, second):
+    assert query_key(first) != query_key(second)
+    executed, shared = _run_concurrently([first, second])
+    assert sorted(executed) == sorted([first, second])
+    assert shared == 0
+
+
+def test_case_and_whitespace_variants_share_a_flight():
+    executed, shared = _run_concurrently(["What is 2+2?", "  what IS   2+2?"])
+    assert len(executed) == 1
+    assert shared == 1
@@ -0,0 +1,21 @@
+"""The compact /search prompt must stay a search prompt, not the Manus agent prompt."""
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+pytest.importorskip("boto3")
+pytest.importorskip("langchain")
+
+from agent import llm_search
+
+
+@pytest.mark.parametrize("marker", llm_search._AGENT_ONLY_MARKERS)
+def test_compact_prompt_has_no_agent_sections(marker):
+    assert marker.lower() not in llm_search.compact_system_prompt.lower()
+
+
+def test_compact_prompt_is_shorter_than_full_prompt():
+    assert len(llm_search.compact_system_prompt) * 10 < len(llm_search.system_prompt)
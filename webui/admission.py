@@ -0,0 +1,249 @@
+"""Per-endpoint admission control: concurrency limits with bounded, deadline-limited wait queues."""
+import asyncio
+import functools
+import inspect
+import math
+import threading
+import time
+from collections import deque
+
+from config import Config
+
+CFG = Config()
+
+
+class Rejected(Exception):
+    """A request was not admitted; carries the HTTP status and Retry-After seconds."""
+
+    def __init__(self, endpoint, status, reason, retry_after):
+        super().__init__(f"{endpoint} is overloaded: {reason}")
+        self.endpoint = endpoint
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """
+    Admits at most `max_concurrent` requests at once. Up to `max_queue`
+    more wait, first come first served, for at most `queue_timeout`
+    seconds. Anything beyond that is turned away at once with 429, and a
+    request whose wait runs out gets 503, so overload sheds work early
+    instead of slowing every request down.
+
+    Slots are handed directly to the oldest waiter on release. The same
+    limiter serves threads (acquire) and asyncio tasks (aacquire).
+    """
+
+    def __init__(self, endpoint, max_concurrent, max_queue, queue_timeout):
+        self.endpoint = endpoint
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._waiters = deque()
+        self.active = 0
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        # Smoothed time a request holds its slot, for Retry-After estimates
+        self._hold_time = 1.0
+
+    def retry_after(self):
+        """Seconds until a slot is likely to be free for one more request."""
+        backlog = len(self._waiters) + 1
+        return max(1, math.ceil(self._hold_time * backlog / self.max_concurrent))
+
+    def _try_enter(self, waiter):
+        """Take a free slot, or queue `waiter`. Returns True if admitted."""
+        with self._lock:
+            if self.active < self.max_concurrent and not self._waiters:
+                self.active += 1
+                self.admitted += 1
+                return True
+            if len(self._waiters) >= self.max_queue:
+                self.rejected_full += 1
+                raise Rejected(self.endpoint, 429, "wait queue is full", self.retry_after())
+            self._waiters.append(waiter)
+            return False
+
+    def _give_up(self, waiter):
+        """Leave the queue after the deadline. Returns True if a slot arrived meanwhile."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            self.rejected_timeout += 1
+            raise Rejected(self.endpoint, 503, "queue deadline exceeded", self.retry_after())
+
+    def release(self, held):
+        with self._lock:
+            self._hold_time = 0.8 * self._hold_time + 0.2 * held
+            if self._waiters:
+                # The slot passes straight to the oldest waiter
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                self.admitted += 1
+                waiter.wake()
+            else:
+                self.active -= 1
+
+    def acquire(self):
+        """Block until admitted; raises Rejected. Returns the admission time."""
+        waiter = _ThreadWaiter()
+        if not self._try_enter(waiter):
+            if not waiter.event.wait(self.queue_timeout):
+                self._give_up(waiter)
+        return time.monotonic()
+
+    async def aacquire(self):
+        """Asyncio version of acquire."""
+        waiter = _AsyncWaiter(asyncio.get_running_loop())
+        if not self._try_enter(waiter):
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._give_up(waiter)
+            except asyncio.CancelledError:
+                # Client went away while queued: give the slot back if it arrived
+                with self._lock:
+                    granted = waiter.granted
+                    if not granted:
+                        self._waiters.remove(waiter)
+                if granted:
+                    self.release(0.0)
+                raise
+        return time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": self.active,
+                "waiting": len(self._waiters),
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "admitted": self.admitted,
+                "rejected_queue_full": self.rejected_full,
+                "rejected_deadline": self.rejected_timeout,
+                "avg_hold_seconds": round(self._hold_time, 3),
+            }
+
+
+class _ThreadWaiter:
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+
+    def wake(self):
+        self.event.set()
+
+
+class _AsyncWaiter:
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = loop.create_future()
+        self.granted = False
+
+    def wake(self):
+        self.loop.call_soon_threadsafe(self._set)
+
+    def _set(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(endpoint):
+    """Return the process-wide limiter for an endpoint group ("search" or "reason")."""
+    with _limiters_lock:
+        if endpoint not in _limiters:
+            limits = {
+                "search": (CFG.search_max_concurrent, CFG.search_max_queue),
+                "reason": (CFG.reason_max_concurrent, CFG.reason_max_queue),
+            }[endpoint]
+            _limiters[endpoint] = AdmissionLimiter(endpoint, *limits, CFG.admission_queue_timeout)
+        return _limiters[endpoint]
+
+
+def admission_stats():
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {endpoint: limiter.stats() for endpoint, limiter in limiters.items()}
+
+
+def _rejection(e):
+    return {"error": str(e)}, e.status, {"Retry-After": str(e.retry_after)}
+
+
+def admission(endpoint):
+    """
+    Flask view decorator. The slot is held until the response is closed, so
+    streaming responses keep it for as long as they stream.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import jsonify, make_response
+
+            if not CFG.admission_enabled:
+                return view(*args, **kwargs)
+            limiter = get_limiter(endpoint)
+            try:
+                admitted_at = limiter.acquire()
+            except Rejected as e:
+                body, status, headers = _rejection(e)
+                return jsonify(body), status, headers
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BaseException:
+                limiter.release(time.monotonic() - admitted_at)
+                raise
+            response.call_on_close(lambda: limiter.release(time.monotonic() - admitted_at))
+            return response
+        return wrapper
+    return decorator
+
+
+def async_admission(endpoint):
+    """
+    Quart view decorator. For streaming views that return an async generator
+    body, the slot is held until the generator finishes.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(*args, **kwargs):
+            from quart import jsonify
+
+            if not CFG.admission_enabled:
+                return await view(*args, **kwargs)
+            limiter = get_limiter(endpoint)
+            try:
+                admitted_at = await limiter.aacquire()
+            except Rejected as e:
+                body, status, headers = _rejection(e)
+                return jsonify(body), status, headers
+            release = lambda: limiter.release(time.monotonic() - admitted_at)
+            try:
+                result = await view(*args, **kwargs)
+            except BaseException:
+                release()
+                raise
+            if isinstance(result, tuple) and inspect.isasyncgen(result[0]):
+                return (_release_after(result[0], release),) + result[1:]
+            if inspect.isasyncgen(result):
+                return _release_after(result, release)
+            release()
+            return result
+        return wrapper
+    return decorator
+
+
+async def _release_after(body, release):
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        release()
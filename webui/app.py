@@ -1,14 +1,25 @@
 import sys
 import asyncio
 import os
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import json
+import queue
+import threading
+from contextlib import closing
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from agent.llm_search import llm_serch_function,get_llm
+from agent.llm_search import coalesced_searches,llm_serch_function,llm_search_stream,get_llm
 from agent.research import Research 
+from agent.llm_cache import get_llm_cache
+from agent.provider_router import get_provider_router
+from agent.search_usage import get_search_usage
+from agent.semantic_cache import get_semantic_cache, warm_semantic_cache
+from scrapper.page_cache import get_page_cache
+from webui.admission import admission_stats, admission
+from webui.jobs import JobQueueFull, get_job_manager
+from webui.sse import sse_event
 
 
 app = Flask(__name__)
@@ -17,18 +28,64 @@ CORS(app, resources={r"/*": {"origins": "*", "allow_headers": ["Content-Type"]}}
 
 
 @app.route("/search", methods=["POST"])
+@admission("search")
 def search():
     data = request.get_json()
     query = data.get("query", "").strip()
     model_provider = data.get('model', 'openai') 
+    use_cache = data.get('cache', True) is not False
 
     if not query:
         return jsonify({"error": "Empty query"}), 400
 
-    result = llm_serch_function(query,model_provider=model_provider)
+    result = llm_serch_function(query,model_provider=model_provider, use_cache=use_cache)
     return jsonify({"response": result})
 
+@app.route("/search/stream", methods=["POST"])
+@admission("search")
+def search_stream():
+    """Like /search, but streams the answer as Server-Sent Events:
+    `delta` events with text pieces, then one `done` event."""
+    data = request.get_json()
+    query = data.get("query", "").strip()
+    model_provider = data.get('model', 'openai')
+    use_cache = data.get('cache', True) is not False
+
+    if not query:
+        return jsonify({"error": "Empty query"}), 400
+
+    def generate():
+        try:
+            for piece in llm_search_stream(query, model_provider=model_provider, use_cache=use_cache):
+                yield sse_event({"content": piece}, "delta")
+            yield sse_event({"status": "ok"}, "done")
+        except Exception as e:
+            print(f"Error in /search/stream: {str(e)}")
+            yield sse_event({"error": str(e)}, "error")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    llm_cache = get_llm_cache()
+    semantic_cache = get_semantic_cache()
+    return jsonify({
+        "llm_cache": llm_cache.stats() if llm_cache else None,
+        "semantic_cache": semantic_cache.stats() if semantic_cache else None,
+        "page_cache": get_page_cache().stats(),
+        "search_usage": get_search_usage().stats(),
+        "search_coalesced": coalesced_searches(),
+        "providers": get_provider_router().stats(),
+        "jobs": get_job_manager().stats(),
+        "admission": admission_stats(),
+    })
+
 @app.route("/reason", methods=["POST"])
+@admission("reason")
 def reason():
     try:
         print("Headers:", request.headers)
@@ -69,6 +126,117 @@ def reason():
     except Exception as e:
         print("Error in /reason endpoint:", str(e))
         return jsonify({"error": str(e)}), 500
-    
+
+@app.route("/reason/stream", methods=["POST"])
+@admission("reason")
+def reason_stream():
+    """Streams a research run as Server-Sent Events: stage events
+    (queries_generated, source_fetched, extraction_done, context_packed),
+    then `report_delta` events with report text, then `done` or `error`."""
+    data = request.get_json(silent=True) or {}
+    query = data.get("query", "").strip()
+    if not query:
+        return jsonify({"error": "Empty query"}), 400
+
+    events = queue.Queue()
+    # Set when the client goes away; the run stops at the next stage or report chunk
+    stop = threading.Event()
+
+    def run():
+        try:
+            research_agent = Research(question=query, agent="Default Agent", system_prompt="",
+                                      stream_output=events.put)
+            research_agent.search_online()
+            if stop.is_set():
+                return
+            with closing(research_agent.write_report_stream("Research Report", "")) as report:
+                for piece in report:
+                    if stop.is_set():
+                        return
+                    events.put({"type": "report_delta", "content": piece})
+            events.put({"type": "done"})
+        except Exception as e:
+            print(f"Error in /reason/stream: {str(e)}")
+            events.put({"type": "error", "error": str(e)})
+        finally:
+            events.put(None)
+
+    threading.Thread(target=run, daemon=True).start()
+
+    def generate():
+        try:
+            while True:
+                event = events.get()
+                if event is None:
+                    return
+                yield sse_event(event, event["type"])
+        finally:
+            stop.set()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    """Queues a research job and returns its id at once (202)."""
+    data = request.get_json(silent=True) or {}
+    query = data.get("query", "").strip()
+    if not query:
+        return jsonify({"error": "Empty query"}), 400
+
+    try:
+        job, deduplicated = get_job_manager().submit(query)
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "30"}
+    return jsonify({"job_id": job["id"], "status": job["status"], "deduplicated": deduplicated}), 202
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
+
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    job = get_job_manager().cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """Streams a job's progress as Server-Sent Events (see /reason/stream),
+    ending with a done, failed or cancelled event."""
+    manager = get_job_manager()
+    if manager.get(job_id) is None:
+        return jsonify({"error": "Unknown job"}), 404
+
+    def generate():
+        after = 0
+        while True:
+            events, finished = manager.events(job_id, after)
+            for event in events:
+                yield sse_event(event, event["type"])
+            after += len(events)
+            if finished:
+                return
+            if not events:
+                yield ": keep-alive\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 if __name__ == "__main__":
+    # Load the embedding model now rather than on the first /search. Done
+    # here, not at import, because extraction workers re-import this module;
+    # with the reloader only the serving child process loads it.
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        warm_semantic_cache()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,263 @@
+"""
+ASGI version of webui/app.py with the same routes and JSON contracts.
+
+Research sessions run on the event loop, so one process can hold many
+in-flight /reason requests without a thread each. Run it with:
+
+    hypercorn webui.asgi_app:app --bind 0.0.0.0:5000
+"""
+import sys
+import asyncio
+import os
+from quart import Quart, request, jsonify
+from quart_cors import cors
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agent.llm_search import coalesced_searches, llm_serch_function, llm_search_stream
+from agent.research import Research
+from agent.llm_cache import get_llm_cache
+from agent.provider_router import get_provider_router
+from agent.search_usage import get_search_usage
+from agent.semantic_cache import get_semantic_cache, warm_semantic_cache
+from scrapper.page_cache import get_page_cache
+from webui.admission import admission_stats, async_admission
+from webui.jobs import JobQueueFull, get_job_manager
+from webui.sse import sse_event
+
+
+app = cors(Quart(__name__), allow_origin="*", allow_headers=["Content-Type"])
+
+_done = object()
+
+
+async def iterate_in_thread(iterator):
+    """Drive a blocking iterator from worker threads, one item at a time."""
+    iterator = iter(iterator)
+    while True:
+        item = await asyncio.to_thread(next, iterator, _done)
+        if item is _done:
+            return
+        yield item
+
+
+@app.before_serving
+async def warm_up():
+    # Load the embedding model now rather than on the first /search; not at
+    # import, since extraction workers may re-import the main module
+    warm_semantic_cache()
+
+
+@app.route("/search", methods=["POST"])
+@async_admission("search")
+async def search():
+    data = await request.get_json()
+    query = data.get("query", "").strip()
+    model_provider = data.get('model', 'openai')
+    use_cache = data.get('cache', True) is not False
+
+    if not query:
+        return jsonify({"error": "Empty query"}), 400
+
+    result = await asyncio.to_thread(llm_serch_function, query, model_provider=model_provider, use_cache=use_cache)
+    return jsonify({"response": result})
+
+
+@app.route("/search/stream", methods=["POST"])
+@async_admission("search")
+async def search_stream():
+    """Like /search, but streams the answer as Server-Sent Events:
+    `delta` events with text pieces, then one `done` event."""
+    data = await request.get_json()
+    query = data.get("query", "").strip()
+    model_provider = data.get('model', 'openai')
+    use_cache = data.get('cache', True) is not False
+
+    if not query:
+        return jsonify({"error": "Empty query"}), 400
+
+    async def generate():
+        try:
+            async for piece in iterate_in_thread(
+                    llm_search_stream(query, model_provider=model_provider, use_cache=use_cache)):
+                yield sse_event({"content": piece}, "delta")
+            yield sse_event({"status": "ok"}, "done")
+        except Exception as e:
+            print(f"Error in /search/stream: {str(e)}")
+            yield sse_event({"error": str(e)}, "error")
+
+    return generate(), 200, {
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    }
+
+
+@app.route("/stats", methods=["GET"])
+async def stats():
+    llm_cache = get_llm_cache()
+    semantic_cache = get_semantic_cache()
+    return jsonify({
+        "llm_cache": llm_cache.stats() if llm_cache else None,
+        "semantic_cache": semantic_cache.stats() if semantic_cache else None,
+        "page_cache": get_page_cache().stats(),
+        "search_usage": get_search_usage().stats(),
+        "search_coalesced": coalesced_searches(),
+        "providers": get_provider_router().stats(),
+        "jobs": get_job_manager().stats(),
+        "admission": admission_stats(),
+    })
+
+
+@app.route("/reason", methods=["POST"])
+@async_admission("reason")
+async def reason():
+    try:
+        data = await request.get_json(silent=True)
+        if data is None:
+            data = await request.get_json(force=True)
+            if data is None:
+                return jsonify({"error": "Empty or invalid JSON in request body"}), 400
+        query = data.get("query", "").strip()
+        print("Query:", query)
+
+        if not query:
+            return jsonify({"error": "Empty query"}), 400
+
+        try:
+            research_agent = Research(question=query, agent="Default Agent", system_prompt="")
+            search_results = await research_agent.asearch_online()
+            if not search_results:
+                return jsonify({"error": "No search results found"}), 500
+
+            report_type = "Research Report"
+            try:
+                report_content = await research_agent.awrite_report(report_type, "")
+                print("Report content:", report_content[:100] if report_content else "None")
+            except Exception as e:
+                print(f"Error generating report: {str(e)}")
+                return jsonify({"error": f"Failed to generate report: {str(e)}"}), 500
+
+            if not report_content:
+                return jsonify({"error": "Failed to generate report content"}), 500
+
+            return jsonify({"response": report_content})
+        except Exception as e:
+            print(f"Error in research process: {str(e)}")
+            return jsonify({"error": f"Research error: {str(e)}"}), 500
+    except Exception as e:
+        print("Error in /reason endpoint:", str(e))
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/reason/stream", methods=["POST"])
+@async_admission("reason")
+async def reason_stream():
+    """Streams a research run as Server-Sent Events: stage events
+    (queries_generated, source_fetched, extraction_done, context_packed),
+    then `report_delta` events with report text, then `done` or `error`."""
+    data = await request.get_json(silent=True) or {}
+    query = data.get("query", "").strip()
+    if not query:
+        return jsonify({"error": "Empty query"}), 400
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def push(event):
+        # Fetch events arrive from fetch-engine threads
+        loop.call_soon_threadsafe(events.put_nowait, event)
+
+    async def run():
+        try:
+            research_agent = Research(question=query, agent="Default Agent", system_prompt="",
+                                      stream_output=push)
+            await research_agent.asearch_online()
+            async for piece in research_agent.awrite_report_stream("Research Report", ""):
+                events.put_nowait({"type": "report_delta", "content": piece})
+            events.put_nowait({"type": "done"})
+        except Exception as e:
+            print(f"Error in /reason/stream: {str(e)}")
+            events.put_nowait({"type": "error", "error": str(e)})
+        finally:
+            events.put_nowait(None)
+
+    async def generate():
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    return
+                yield sse_event(event, event["type"])
+        finally:
+            # Client went away: stop the research run
+            task.cancel()
+
+    return generate(), 200, {
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    }
+
+
+@app.route("/jobs", methods=["POST"])
+async def submit_job():
+    """Queues a research job and returns its id at once (202)."""
+    data = await request.get_json(silent=True) or {}
+    query = data.get("query", "").strip()
+    if not query:
+        return jsonify({"error": "Empty query"}), 400
+
+    try:
+        job, deduplicated = get_job_manager().submit(query)
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "30"}
+    return jsonify({"job_id": job["id"], "status": job["status"], "deduplicated": deduplicated}), 202
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+async def job_status(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
+
+
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+async def cancel_job(job_id):
+    job = get_job_manager().cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
+
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+async def job_events(job_id):
+    """Streams a job's progress as Server-Sent Events (see /reason/stream),
+    ending with a done, failed or cancelled event."""
+    manager = get_job_manager()
+    if manager.get(job_id) is None:
+        return jsonify({"error": "Unknown job"}), 404
+
+    async def generate():
+        after = 0
+        while True:
+            events, finished = await asyncio.to_thread(manager.events, job_id, after)
+            for event in events:
+                yield sse_event(event, event["type"])
+            after += len(events)
+            if finished:
+                return
+            if not events:
+                yield ": keep-alive\n\n"
+
+    return generate(), 200, {
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    }
+
+
+if __name__ == "__main__":
+    app.run(debug=True)
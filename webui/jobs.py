@@ -0,0 +1,263 @@
+"""Background research jobs: submit a question, then poll or subscribe for the report."""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from actions.searxng_search import normalize_query
+from agent.research import Research
+from config import Config
+
+CFG = Config()
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class JobQueueFull(Exception):
+    """Raised when the number of unfinished jobs has reached the limit."""
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's worker once the job has been cancelled."""
+
+
+class Job:
+    """In-memory state of an unfinished job: its progress events and cancel flag."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.events = []
+        self.cancelled = threading.Event()
+        self.future = None
+
+
+class JobManager:
+    """
+    Runs research jobs on a bounded worker pool, independent of HTTP
+    request handling.
+
+    Job state is kept in SQLite, so status and results survive a restart;
+    jobs that were unfinished when the process stopped are queued again.
+    Submitting a question that matches an unfinished job (after
+    normalize_query, which keeps symbols such as + and #, so "2+2" and
+    "2-2" stay apart) returns that job instead of starting a new one.
+    A running job is cancelled at the next stage boundary or report chunk.
+    A finished job's progress events stay in memory for `events_grace`
+    seconds so subscribers can read the rest of them.
+    """
+
+    def __init__(self, path=None, workers=None, max_unfinished=None, retention=None, events_grace=None):
+        self.path = path or os.path.join(CFG.cache_dir, "jobs.sqlite")
+        self.max_unfinished = CFG.job_max_unfinished if max_unfinished is None else max_unfinished
+        self.retention = CFG.job_retention if retention is None else retention
+        self.events_grace = CFG.job_events_grace if events_grace is None else events_grace
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                question TEXT,
+                dedupe_key TEXT,
+                report_type TEXT,
+                status TEXT,
+                stage TEXT,
+                result TEXT,
+                error TEXT,
+                created_at REAL,
+                started_at REAL,
+                finished_at REAL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+        self._db.commit()
+        self._jobs = {}
+        # Finished jobs whose events are still kept: job_id -> (finished_at, Job)
+        self._finished = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or CFG.job_workers, thread_name_prefix="research-job"
+        )
+        self._resume()
+
+    def _resume(self):
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (time.time() - self.retention,),
+            )
+            rows = self._db.execute(
+                "SELECT id, question FROM jobs WHERE status IN (?, ?) ORDER BY created_at", (QUEUED, RUNNING)
+            ).fetchall()
+            # Re-key unfinished jobs in case normalize_query changed since they were stored
+            self._db.executemany(
+                "UPDATE jobs SET dedupe_key = ? WHERE id = ?",
+                [(normalize_query(row["question"]), row["id"]) for row in rows],
+            )
+            self._db.execute(
+                "UPDATE jobs SET status = ?, stage = 'queued', started_at = NULL WHERE status = ?",
+                (QUEUED, RUNNING),
+            )
+            self._db.commit()
+            for row in rows:
+                self._start(row["id"])
+        if rows:
+            print(f"Resumed {len(rows)} unfinished research jobs")
+
+    def _start(self, job_id):
+        job = Job(job_id)
+        self._jobs[job_id] = job
+        job.future = self._executor.submit(self._run, job)
+
+    def _update(self, job_id, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        self._db.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+        self._db.commit()
+
+    def submit(self, question, report_type="Research Report"):
+        """
+        Queue a research job and return (job, deduplicated).
+
+        Raises:
+            JobQueueFull: If max_unfinished jobs are already queued or running.
+        """
+        key = normalize_query(question)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM jobs WHERE dedupe_key = ? AND report_type = ? AND status IN (?, ?)",
+                (key, report_type, QUEUED, RUNNING),
+            ).fetchone()
+            if row is not None:
+                return dict(row), True
+            if len(self._jobs) >= self.max_unfinished:
+                raise JobQueueFull(f"{len(self._jobs)} research jobs are already queued or running")
+            job_id = uuid.uuid4().hex
+            self._db.execute(
+                "INSERT INTO jobs (id, question, dedupe_key, report_type, status, stage, created_at) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+                (job_id, question, key, report_type, QUEUED, time.time()),
+            )
+            self._db.commit()
+            self._start(job_id)
+            return self._get(job_id), False
+
+    def _get(self, job_id):
+        row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def get(self, job_id):
+        """Return the job as a dict, or None if it does not exist."""
+        with self._lock:
+            return self._get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job. Returns the job, or None if unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.cancelled.set()
+                if job.future.cancel():
+                    self._finish(job, CANCELLED, error="Cancelled before it started")
+            return self._get(job_id)
+
+    def _emit(self, job, event):
+        with self._lock:
+            job.events.append(event)
+            if event["type"] != "report_delta":
+                self._update(job.job_id, stage=event["type"])
+            self._changed.notify_all()
+
+    def _finish(self, job, status, result=None, error=None):
+        """Record the final state; the caller holds the lock."""
+        self._update(job.job_id, status=status, stage=status, result=result, error=error,
+                      finished_at=time.time())
+        job.events.append({"type": status, "error": error} if error else {"type": status})
+        self._jobs.pop(job.job_id, None)
+        now = time.time()
+        self._finished[job.job_id] = (now, job)
+        for job_id, (finished_at, _) in list(self._finished.items()):
+            if now - finished_at > self.events_grace:
+                del self._finished[job_id]
+        self._changed.notify_all()
+
+    def _check(self, job):
+        if job.cancelled.is_set():
+            raise JobCancelled()
+
+    def _run(self, job):
+        with self._lock:
+            row = self._get(job.job_id)
+            self._update(job.job_id, status=RUNNING, stage="started", started_at=time.time())
+        try:
+            self._check(job)
+            research = Research(question=row["question"], agent="Default Agent", system_prompt="",
+                                stream_output=lambda event: self._emit(job, event))
+            research.search_online()
+            self._check(job)
+            if CFG.report_mode == "pack":
+                # Streaming the report lets a cancel take effect mid-report
+                pieces = []
+                for piece in research.write_report_stream(row["report_type"], ""):
+                    self._check(job)
+                    pieces.append(piece)
+                    self._emit(job, {"type": "report_delta", "content": piece})
+                report = "".join(pieces)
+            else:
+                report = research.write_report(row["report_type"], "")
+            self._check(job)
+            if not report:
+                raise RuntimeError("Failed to generate report content")
+        except JobCancelled:
+            with self._lock:
+                self._finish(job, CANCELLED, error="Cancelled")
+        except Exception as e:
+            print(f"Research job {job.job_id} failed: {str(e)}")
+            with self._lock:
+                self._finish(job, FAILED, error=str(e))
+        else:
+            with self._lock:
+                self._finish(job, DONE, result=report)
+
+    def events(self, job_id, after=0, timeout=15):
+        """
+        Wait up to `timeout` seconds for progress events past index `after`.
+        Returns (events, finished). Events are kept while the job runs and
+        for events_grace seconds after; past that (or after a restart) a
+        finished job returns just its final state, and an unknown job none.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None and job_id in self._finished:
+                job = self._finished[job_id][1]
+            if job is not None and len(job.events) <= after and job_id in self._jobs:
+                self._changed.wait_for(
+                    lambda: len(job.events) > after or job_id not in self._jobs, timeout=timeout
+                )
+            if job is None:
+                row = self._get(job_id)
+                if row is None:
+                    return [], True
+                return [{"type": row["status"], "error": row["error"]}], True
+            return job.events[after:], job_id not in self._jobs
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            return {"unfinished": len(self._jobs), "max_unfinished": self.max_unfinished, "by_status": counts}
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """Return the process-wide job manager."""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = JobManager()
+    return _manager
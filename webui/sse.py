@@ -0,0 +1,8 @@
+"""Server-Sent Events formatting shared by the Flask and ASGI apps."""
+import json
+
+
+def sse_event(payload, event=None):
+    """Format one Server-Sent Event carrying a JSON payload."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload)}\n\n"
@@ -15,11 +15,8 @@ def reason():
         if not search_results:
             return jsonify({"error": "No response from the model"}), 500
         report_type = "Research Report"
-        report_generator = research_agent.write_report(report_type, "")
-        report_content = ""
-
-        for chunk in report_generator:
-            report_content += chunk
+        # The stream yields only new text, so joining the pieces is linear
+        report_content = "".join(research_agent.write_report_stream(report_type, ""))
 
         if not report_content:
             return jsonify({"error": "Failed to generate report content"}), 500